@@ -0,0 +1,345 @@
+import hashlib
+import os
+import random
+from collections import OrderedDict
+from threading import RLock, Thread
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from PIL import Image
+
+from constants import ALBUM_CACHE_BYTES
+from ingest import image_ingest
+from log import logger
+
+# 相册中会被显示的图像文件扩展名
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp", ".tif", ".tiff")
+
+
+class AlbumIndex:
+    """
+    相册索引
+    缓存相册文件夹中的图像列表及路径到序号的映射，只有文件夹的修改时间变化时才重新扫描，
+    查找当前照片、上一张、下一张和随机照片都是 O(1) 操作
+    """
+
+    def __init__(self, album_dir: str):
+        self._album_dir = album_dir
+        self._photos: List[str] = []
+        self._positions: Dict[str, int] = {}
+        # 上次扫描时文件夹的修改时间
+        self._mtime: Optional[int] = None
+        self.lock = RLock()
+
+    def __len__(self) -> int:
+        return len(self._photos)
+
+    def __getitem__(self, index: int) -> str:
+        return self._photos[index]
+
+    @staticmethod
+    def is_image(name: str) -> bool:
+        return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+    def refresh(self) -> bool:
+        """
+        文件夹发生变化时增量更新索引：保留原有照片的顺序，删除已不存在的照片，新照片追加到末尾
+        :return: 索引是否发生变化
+        """
+        with self.lock:
+            try:
+                mtime = os.stat(self._album_dir).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime == self._mtime and mtime is not None:
+                return False
+            self._mtime = mtime
+            if mtime is None:
+                files = set()
+            else:
+                with os.scandir(self._album_dir) as entries:
+                    files = {entry.path for entry in entries if entry.is_file() and self.is_image(entry.name)}
+            photos = [photo for photo in self._photos if photo in files]
+            known = set(photos)
+            photos.extend(sorted(files - known))
+            if photos == self._photos:
+                return False
+            self._photos = photos
+            self._positions = {photo: i for i, photo in enumerate(photos)}
+            logger.debug(f"相册索引已更新，共 {len(photos)} 张照片")
+            return True
+
+    def photos(self) -> List[str]:
+        with self.lock:
+            return list(self._photos)
+
+    def index_of(self, photo: str) -> Optional[int]:
+        return self._positions.get(photo)
+
+    def first(self) -> str:
+        """
+        :return: 相册为空时返回空字符串
+        """
+        with self.lock:
+            return self._photos[0] if self._photos else ""
+
+    def next(self, photo: str, offset: int = 1) -> str:
+        """
+        相对 photo 偏移 offset 张的照片，循环播放；photo 不在相册中时返回第一张
+        :param photo:
+        :param offset: 为 -1 时即上一张
+        :return: 相册为空时返回空字符串
+        """
+        with self.lock:
+            if not self._photos:
+                return ""
+            index = self._positions.get(photo)
+            if index is None:
+                return self._photos[0]
+            return self._photos[(index + offset) % len(self._photos)]
+
+    def previous(self, photo: str) -> str:
+        return self.next(photo, -1)
+
+    def random(self) -> str:
+        with self.lock:
+            return random.choice(self._photos) if self._photos else ""
+
+
+class PhotoCache:
+    """
+    相册照片的磁盘缓存
+    保存已缩放到屏幕尺寸、可直接显示的照片，以源文件路径、修改时间、目标尺寸和填充色作为键，
+    总大小超过上限时按最近最少使用的顺序淘汰
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = ALBUM_CACHE_BYTES):
+        self._cache_dir = cache_dir
+        self._max_bytes = max_bytes
+        # 缓存文件名 -> 文件大小，按最近使用的先后排列
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._warm_thread: Optional[Thread] = None
+        self.lock = RLock()
+        self._load()
+
+    def _load(self):
+        os.makedirs(self._cache_dir, exist_ok=True)
+        files = []
+        with os.scandir(self._cache_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(".png"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, entry.name, stat.st_size))
+        # 文件修改时间即最近一次使用的时间
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total += size
+
+    @staticmethod
+    def _key(path: str, size: Tuple[int, int], fill: Tuple[int, int, int]) -> Optional[str]:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        key = f"{path}|{mtime}|{size[0]}x{size[1]}|{fill}"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest() + ".png"
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self._cache_dir, name)
+
+    def get(self, path: str, size: Tuple[int, int], fill=(0xFF, 0xFF, 0xFF)) -> Image.Image:
+        """
+        获取缩放后的照片，未缓存时缩放原图并写入缓存
+        :param path:
+        :param size:
+        :param fill:
+        :return:
+        """
+        name = self._key(path, size, fill)
+        if name is not None:
+            with self.lock:
+                cached = name in self._entries
+                if cached:
+                    self._entries.move_to_end(name)
+            if cached:
+                try:
+                    img = Image.open(self._path(name))
+                    img.load()
+                    os.utime(self._path(name))
+                    with self.lock:
+                        self.hits += 1
+                    return img
+                except OSError:
+                    logger.warning(f"读取照片缓存失败：{path}")
+                    self._remove(name)
+        with self.lock:
+            self.misses += 1
+        return self._render(path, size, fill, name)
+
+    def _render(self, path: str, size: Tuple[int, int], fill, name: Optional[str]) -> Image.Image:
+        img = image_ingest.load(path, size, fill)
+        if name is not None:
+            self._put(name, img)
+        return img
+
+    def _put(self, name: str, img: Image.Image):
+        tem_path = self._path(name) + ".tem"
+        try:
+            img.save(tem_path, format="PNG", compress_level=1)
+            os.replace(tem_path, self._path(name))
+            file_size = os.path.getsize(self._path(name))
+        except OSError:
+            logger.exception("写入照片缓存失败")
+            return
+        with self.lock:
+            if name in self._entries:
+                self._total -= self._entries[name]
+            self._entries[name] = file_size
+            self._total += file_size
+            self._evict()
+
+    def _remove(self, name: str):
+        with self.lock:
+            self._total -= self._entries.pop(name, 0)
+        try:
+            os.remove(self._path(name))
+        except OSError:
+            pass
+
+    def _evict(self):
+        while self._total > self._max_bytes and len(self._entries) > 1:
+            name, file_size = self._entries.popitem(last=False)
+            self._total -= file_size
+            self.evictions += 1
+            try:
+                os.remove(self._path(name))
+            except OSError:
+                pass
+
+    def warm_up(self, paths: Iterable[str], size: Tuple[int, int], fill=(0xFF, 0xFF, 0xFF)) -> bool:
+        """
+        在后台预先缩放所有未缓存的照片
+        :param paths:
+        :param size:
+        :param fill:
+        :return: 已有预热任务在运行时返回 False
+        """
+        with self.lock:
+            if self._warm_thread is not None and self._warm_thread.is_alive():
+                return False
+            paths = list(paths)
+            self._warm_thread = Thread(target=self._warm_up, args=(paths, size, fill), name="album-warm-up",
+                                       daemon=True)
+            self._warm_thread.start()
+        return True
+
+    def _warm_up(self, paths: List[str], size: Tuple[int, int], fill):
+        logger.debug(f"开始预热照片缓存，共 {len(paths)} 张照片")
+        for path in paths:
+            name = self._key(path, size, fill)
+            with self.lock:
+                if name is None or name in self._entries:
+                    continue
+            try:
+                self._render(path, size, fill, name)
+            except:
+                logger.exception(f"预热照片缓存失败：{path}")
+        logger.debug("照片缓存预热完成")
+
+    def stats(self) -> dict:
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "files": len(self._entries),
+                "bytes": self._total,
+                "max_bytes": self._max_bytes,
+                "warming_up": self._warm_thread is not None and self._warm_thread.is_alive(),
+            }
+
+
+class PhotoPrefetcher:
+    """
+    在后台提前准备下一张要显示的照片
+    重新 start 或 cancel 时，尚未完成的准备结果会被丢弃
+    """
+
+    def __init__(self, cache: PhotoCache, size: Tuple[int, int], fill=(0xFF, 0xFF, 0xFF)):
+        self._cache = cache
+        self._size = size
+        self._fill = fill
+        self._path = ""
+        # 准备好的照片及其源文件的修改时间
+        self._image: Optional[Image.Image] = None
+        self._mtime: Optional[int] = None
+        # 每次 start 或 cancel 时递增，用于丢弃过期的准备结果
+        self._generation = 0
+        self.lock = RLock()
+
+    @staticmethod
+    def _mtime_of(path: str) -> Optional[int]:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def start(self, path: str):
+        """
+        开始准备 path 对应的照片，正在准备或已准备好同一张照片时不做任何事
+        :param path:
+        :return:
+        """
+        with self.lock:
+            if path == self._path:
+                return
+            self._generation += 1
+            self._path = path
+            self._image = None
+            self._mtime = None
+            if path == "":
+                return
+            generation = self._generation
+        Thread(target=self._run, args=(path, generation), name="album-prefetch", daemon=True).start()
+        logger.debug(f"开始预取照片：{path}")
+
+    def cancel(self):
+        with self.lock:
+            self._generation += 1
+            self._path = ""
+            self._image = None
+            self._mtime = None
+
+    def take(self, path: str) -> Optional[Image.Image]:
+        """
+        取出已准备好的照片
+        :param path:
+        :return: 尚未准备好、照片不同或源文件已被修改时返回 None
+        """
+        with self.lock:
+            if path != self._path or self._image is None or self._mtime != self._mtime_of(path):
+                return None
+            image = self._image
+            self._path = ""
+            self._image = None
+            self._mtime = None
+            return image
+
+    def _run(self, path: str, generation: int):
+        mtime = self._mtime_of(path)
+        try:
+            image = self._cache.get(path, self._size, self._fill)
+        except:
+            logger.exception(f"预取照片失败：{path}")
+            return
+        with self.lock:
+            if generation != self._generation:
+                logger.debug(f"丢弃过期的预取照片：{path}")
+                return
+            self._image = image
+            self._mtime = mtime
@@ -1,5 +1,6 @@
 import os
 import shutil
+import time
 from enum import Enum
 from typing import Iterable
 
@@ -8,9 +9,10 @@ from fastapi import FastAPI, File, UploadFile
 from pydantic import BaseModel
 
 from constants import ROOT_DIR, HOST, API_PORT
+from ingest import ImageTooLarge, image_ingest
 from mode import BaseMode
 from response import BaseResponse
-from singleton import config, fixed_mode, movie_mode
+from singleton import config, fixed_mode, movie_mode, album_mode
 
 
 def create_app(modes: Iterable[BaseMode]):
@@ -28,6 +30,10 @@ def create_app(modes: Iterable[BaseMode]):
             "name": "movie",
             "description": "慢放电影模式",
         },
+        {
+            "name": "album",
+            "description": "轮播相册模式",
+        },
     ]
 
     app = FastAPI(
@@ -45,7 +51,11 @@ def create_app(modes: Iterable[BaseMode]):
         with fixed_mode.lock:
             if "image" not in file.content_type:
                 return BaseResponse(code=400, msg="image file only")
-            fixed_mode.api_func(file.file)
+            try:
+                fixed_mode.api_func(file.file)
+            except ImageTooLarge as e:
+                return BaseResponse(code=413, msg=str(e))
+            config.wake()
             return BaseResponse(msg="image uploaded")
 
     class FixedItem(BaseModel):
@@ -56,6 +66,7 @@ def create_app(modes: Iterable[BaseMode]):
     def upload_fixed_text(item: FixedItem):
         with fixed_mode.lock:
             fixed_mode.api_func(None, item.text, item.alpha)
+            config.wake()
             return BaseResponse(msg="text uploaded")
 
     @app.post("/mode/movie/video", tags=["movie"])
@@ -71,21 +82,58 @@ def create_app(modes: Iterable[BaseMode]):
                 if os.path.exists(movie_mode._movie_path):
                     os.remove(movie_mode._movie_path)
                 os.rename(path, movie_mode._movie_path)
-                config.update_config({"movie": {"index": 0}})
+                movie_mode.reset_video()
+                config.update_config({"movie": {"index": 0, "start": time.time()}})
             finally:
                 file.file.close()
             return BaseResponse(msg="video uploaded")
 
+    class Playback(str, Enum):
+        step = "step"
+        duration = "duration"
+        clock = "clock"
+
     class MovieItem(BaseModel):
         index: int
         interval: int
+        # 播放方式：每次前进 step 帧、在 duration 秒内播完或按现实时间播放
+        playback: Playback = Playback.step
+        step: int = 1
+        duration: int = 0
 
     @app.put("/mode/movie/config", tags=["movie"])
     def update_movie_config(item: MovieItem):
         with movie_mode.lock:
-            config.update_config({"movie": {"index": item.index, "interval": item.interval}})
+            if item.step < 1 or item.duration < 0:
+                return BaseResponse(code=400, msg="step must be positive and duration non-negative")
+            if item.playback != Playback.step and item.duration == 0:
+                return BaseResponse(code=400, msg="duration required")
+            data = {
+                "index": item.index,
+                "interval": item.interval,
+                "playback": item.playback.value,
+                "step": item.step,
+                "duration": item.duration,
+            }
+            if item.playback == Playback.clock:
+                data["start"] = movie_mode.clock_start(item.index, item.duration)
+            config.update_config({"movie": data})
             return BaseResponse(msg="movie config updated")
 
+    @app.post("/mode/album/warmup", tags=["album"])
+    def warm_up_album() -> BaseResponse:
+        if not album_mode.warm_up():
+            return BaseResponse(code=409, msg="warm-up already running")
+        return BaseResponse(msg="warm-up started")
+
+    @app.get("/mode/album/cache", tags=["album"])
+    def get_album_cache_stats() -> BaseResponse:
+        return BaseResponse(data=album_mode.cache_stats())
+
+    @app.get("/image/stats")
+    def get_image_stats() -> BaseResponse:
+        return BaseResponse(data=image_ingest.stats())
+
     return app
 
 
@@ -0,0 +1,251 @@
+"""
+性能测试脚本
+用法：python benchmark.py [名称 ...]，不指定名称时运行全部测试
+"""
+import io
+import multiprocessing
+import os
+import sys
+import tempfile
+import timeit
+from math import floor
+
+from PIL import Image, ImageDraw, ImageFont
+
+from constants import WIDTH, HEIGHT, FONT_PATH
+from ingest import ImageTooLarge, image_ingest
+from text import draw_text, get_font, layout_text
+from utils import get_hash, get_fingerprint, get_peak_rss, resize_img
+from waveshare_epd import packing
+
+# 部分墨水屏型号的分辨率
+PANELS = {
+    "epd1in54": (200, 200),
+    "epd2in9": (128, 296),
+    "epd4in2": (400, 300),
+    "epd5in83_V2": (648, 480),
+    "epd7in5_HD": (880, 528),
+    "epd13in3k": (960, 680),
+}
+
+
+def _photo_image(size=(WIDTH, HEIGHT)) -> Image.Image:
+    """
+    生成类似照片的全尺寸测试图像（随机噪声，PNG 编码的最坏情况）
+    :param size:
+    :return:
+    """
+    return Image.effect_noise(size, 64).convert("RGB")
+
+
+def _clock_image(size=(WIDTH, HEIGHT)) -> Image.Image:
+    """
+    生成类似时钟模式的全尺寸黑白测试图像
+    :param size:
+    :return:
+    """
+    image = Image.new("RGB", size, (0xFF, 0xFF, 0xFF))
+    draw = ImageDraw.Draw(image)
+    radius = min(size) // 3
+    center = (size[0] // 2, size[1] // 2)
+    draw.ellipse((center[0] - radius, center[1] - radius, center[0] + radius, center[1] + radius), fill="black")
+    return image
+
+
+def _report(name: str, func, number: int = 5) -> float:
+    cost = min(timeit.repeat(func, number=1, repeat=number)) * 1000
+    print(f"  {name:<32}{cost:>10.2f} ms")
+    return cost
+
+
+def bench_fingerprint():
+    """
+    比较 PNG 编码 + md5 与原始像素 crc32 两种画面指纹的耗时
+    :return:
+    """
+
+    def png_md5(img):
+        data = io.BytesIO()
+        img.save(data, format="PNG")
+        return get_hash(data.getvalue())
+
+    for label, image in (("photo", _photo_image()), ("clock", _clock_image())):
+        print(f"{label} {image.width}x{image.height}:")
+        old = _report("PNG + md5", lambda: png_md5(image))
+        new = _report("tobytes + crc32", lambda: get_fingerprint(image))
+        print(f"  speedup: {old / new:.1f}x")
+
+
+def bench_getbuffer():
+    """
+    比较逐像素循环与向量化两种单色 getbuffer 的耗时
+    :return:
+    """
+
+    def loop_getbuffer(img, width, height):
+        # 驱动原有的逐像素实现
+        buf = [0xFF] * (int(width / 8) * height)
+        pixels = img.convert('1').load()
+        for y in range(height):
+            for x in range(width):
+                if pixels[x, y] == 0:
+                    buf[int((x + y * width) / 8)] &= ~(0x80 >> (x % 8))
+        return buf
+
+    for name, size in PANELS.items():
+        image = _photo_image(size)
+        assert loop_getbuffer(image, *size) == packing.getbuffer(image, *size)
+        print(f"{name} {size[0]}x{size[1]}:")
+        old = _report("pixel loop", lambda: loop_getbuffer(image, *size))
+        new = _report("packing.getbuffer", lambda: packing.getbuffer(image, *size))
+        print(f"  speedup: {old / new:.1f}x")
+
+
+def _camera_photo(path: str, size=(4000, 3000)):
+    """
+    生成 1200 万像素、带 EXIF 方向信息的 JPEG 测试照片
+    :param path:
+    :param size:
+    :return:
+    """
+    small = Image.effect_noise((size[0] // 16, size[1] // 16), 64).convert("RGB")
+    image = small.resize(size, Image.BICUBIC)
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    image.save(path, format="JPEG", quality=90, exif=exif)
+
+
+def _old_resize_img(file, size, fill=(0xFF, 0xFF, 0xFF)):
+    # 全分辨率解码后再缩放的原有实现
+    img = Image.new("RGB", size, fill)
+    data = Image.open(file)
+    if data.size[0] / data.size[1] < size[0] / size[1]:
+        target_height = size[1]
+        target_width = round(target_height / data.size[1] * data.size[0])
+    else:
+        target_width = size[0]
+        target_height = round(target_width / data.size[0] * data.size[1])
+    data = data.resize((target_width, target_height))
+    x = round((size[0] - target_width) / 2)
+    y = round((size[1] - target_height) / 2)
+    img.paste(data, (x, y))
+    return img
+
+
+def _peak_rss(func, path, queue):
+    base = get_peak_rss()
+    func(path, (WIDTH, HEIGHT))
+    queue.put((base, get_peak_rss()))
+
+
+def _report_rss(name: str, func, path: str) -> int:
+    """
+    在新进程中运行 func(path, (WIDTH, HEIGHT)) 并打印内存峰值
+    :return: 内存峰值的增量（KB）
+    """
+    # 在新进程中运行，避免之前分配的内存影响峰值统计
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_peak_rss, args=(func, path, queue))
+    process.start()
+    base, peak = queue.get()
+    process.join()
+    print(f"  {name:<32}{peak / 1024:>10.1f} MB peak RSS (+{(peak - base) / 1024:.1f} MB)")
+    return peak - base
+
+
+def bench_resize():
+    """
+    比较全分辨率解码与按目标尺寸解码两种 resize_img 的耗时和内存峰值
+    :return:
+    """
+    with tempfile.TemporaryDirectory() as tem_dir:
+        path = os.path.join(tem_dir, "photo.jpg")
+        _camera_photo(path)
+        print(f"JPEG 4000x3000 -> {WIDTH}x{HEIGHT}:")
+        old = _report("full decode + resize", lambda: _old_resize_img(path, (WIDTH, HEIGHT)), 3)
+        new = _report("draft + reduce", lambda: resize_img(path, (WIDTH, HEIGHT)), 3)
+        print(f"  speedup: {old / new:.1f}x")
+        _report_rss("full decode + resize", _old_resize_img, path)
+        _report_rss("draft + reduce", resize_img, path)
+
+
+def _ingest_load(path: str, size):
+    # 超出限制的图像会被拒绝，统计的是拒绝之前的内存峰值
+    try:
+        image_ingest.load(path, size)
+    except ImageTooLarge as e:
+        print(f"  rejected: {e}")
+
+
+def bench_ingest():
+    """
+    检查读取超出解码上限的 PNG 时，拒绝之前不会解码整张图像
+    :return:
+    """
+    with tempfile.TemporaryDirectory() as tem_dir:
+        for mode, size in (("L", (12000, 12000)), ("RGB", (8000, 6000))):
+            path = os.path.join(tem_dir, "bomb.png")
+            Image.new(mode, size).save(path)
+            decoded = size[0] * size[1] * (1 if mode == "L" else 4) / 1024 / 1024
+            print(f"PNG {mode} {size[0]}x{size[1]} ({os.path.getsize(path) / 1024:.0f} KB, {decoded:.0f} MB decoded):")
+            growth = _report_rss("image_ingest.load", _ingest_load, path) / 1024
+            print(f"  {'bounded' if growth < decoded / 10 else 'NOT BOUNDED'}")
+
+
+def _old_layout(text: str, size):
+    # 按字符类别估算宽度的原有排版实现
+    def get_text_width(line: str) -> float:
+        width = 0
+        for item in line.lower():
+            if item in "abcdefghijklmnopqrstuvwxyz0123456789~!@#$%^&*()_+`-=[]\\;',./{}|:\"<>?":
+                width += 3 / 7
+            elif item == " ":
+                width += 0.5
+            else:
+                width += 1
+        return width
+
+    border_size = min([0.2 * item for item in size])
+    lines = text.split("\n")
+    width = max([get_text_width(item) for item in lines])
+    height = len(lines) + (len(lines) - 1) * 0.5
+    return floor(min([(size[0] - border_size) / width, (size[1] - border_size) / height]))
+
+
+def bench_text():
+    """
+    比较每次读取字体、估算宽度与缓存字体对象、缓存排版结果的耗时
+    :return:
+    """
+    if not os.path.exists(FONT_PATH):
+        print(f"  字体文件不存在，跳过：{FONT_PATH}")
+        return
+    text = "轮播相册模式\n相册文件夹为空"
+    size = (WIDTH, HEIGHT)
+    font_size = layout_text(text, size)[0]
+    print(f"font {os.path.getsize(FONT_PATH) / 1024 / 1024:.1f} MB, size {font_size}:")
+    old = _report("ImageFont.truetype", lambda: ImageFont.truetype(FONT_PATH, font_size))
+    new = _report("get_font (cached)", lambda: get_font(FONT_PATH, font_size))
+    print(f"  speedup: {old / new:.1f}x")
+    print(f"layout {text!r} {WIDTH}x{HEIGHT}:")
+    _report("character estimate", lambda: _old_layout(text, size))
+    layout_text.cache_clear()
+    _report("getbbox binary search", lambda: layout_text(text, size), 1)
+    _report("layout_text (cached)", lambda: layout_text(text, size))
+    _report("draw_text (cached)", lambda: draw_text(text, Image.new("RGB", size)))
+
+
+BENCHMARKS = {
+    "fingerprint": bench_fingerprint,
+    "getbuffer": bench_getbuffer,
+    "resize": bench_resize,
+    "ingest": bench_ingest,
+    "text": bench_text,
+}
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print(f"== {name} ==")
+        BENCHMARKS[name]()
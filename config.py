@@ -1,13 +1,35 @@
+import atexit
+import io
 import os
 import shutil
+import time
 from configparser import ConfigParser
-from threading import RLock
+from threading import Condition, Event, Lock, RLock, Thread
+from typing import Dict, Union
 
-from constants import ROOT_DIR
-from observer import Subject
+from constants import ROOT_DIR, CONFIG_FLUSH_DELAY
+from log import logger
+from observer import Dispatcher
 
 
-class Config(Subject):
+Value = Union[int, float, str]
+
+
+def parse_value(text: str) -> Value:
+    """
+    将配置文件中的字符串解析为 int、float 或原样返回
+    :param text:
+    :return:
+    """
+    for parse in (int, float):
+        try:
+            return parse(text)
+        except ValueError:
+            pass
+    return text
+
+
+class Config(Dispatcher):
     def __init__(self):
         super().__init__()
         self.config = ConfigParser()
@@ -16,25 +38,127 @@ class Config(Subject):
             shutil.copy(os.path.join(ROOT_DIR, "config.ini.default"), self._config_path)
         self.config.read(self._config_path)
         self._dict = None
+        self._version = 0
         self.lock = RLock()
+        # 配置更新或按键按下时唤醒等待中的主循环
+        self._wakeup = Event()
+        # 配置修改先保存在内存中，由后台线程合并后写入磁盘
+        self._dirty = False
+        self._flush_cond = Condition(self.lock)
+        self._write_lock = Lock()
+        self._flusher = Thread(target=self._run_flusher, name="config-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.flush)
 
     @property
-    def dict(self) -> dict:
+    def active_name(self) -> str:
+        return self.dict["base"]["mode"]
+
+    @property
+    def dict(self) -> Dict[str, Dict[str, Value]]:
+        """
+        当前配置的快照，数值已解析为 int 或 float
+        快照不会被原地修改，每次更新都会生成新的快照
+        :return:
+        """
         if self._dict is None:
             self._dict = self._get_config()
         return self._dict
 
-    def _get_config(self) -> dict:
+    @property
+    def version(self) -> int:
+        """
+        配置版本号，每次配置发生变化时加 1，可用于判断配置是否改变
+        :return:
+        """
+        return self._version
+
+    def _get_config(self) -> Dict[str, Dict[str, Value]]:
         data = {}
         for k, v in self.config.items():
-            data[k] = dict(v)
+            data[k] = {k2: parse_value(v2) for k2, v2 in v.items()}
         return data
 
     def update_config(self, item: dict):
         with self.lock:
+            snapshot = dict(self.dict)
+            changed = False
             for k, v in item.items():
+                section = None
                 for k2, v2 in v.items():
-                    self.config[k][k2] = str(v2)
-            self._dict = self._get_config()
-            with open(self._config_path, "w") as f:
-                self.config.write(f)
+                    text = str(v2)
+                    if self.config[k].get(k2) == text:
+                        continue
+                    self.config[k][k2] = text
+                    if section is None:
+                        # 只复制发生变化的配置节
+                        section = dict(snapshot[k])
+                        snapshot[k] = section
+                    section[k2] = parse_value(text)
+                    changed = True
+            if not changed:
+                return
+            self._dict = snapshot
+            self._version += 1
+            self._dirty = True
+            self._flush_cond.notify()
+        self.wake()
+
+    def flush(self):
+        """
+        立即将内存中的配置写入磁盘
+        先写入临时文件再重命名，写入过程中断电也不会损坏原有的配置文件
+        :return:
+        """
+        # 保证多个线程同时 flush 时，较新的配置不会被较旧的覆盖
+        with self._write_lock:
+            with self.lock:
+                if not self._dirty:
+                    return
+                data = io.StringIO()
+                self.config.write(data)
+                self._dirty = False
+            tem_path = self._config_path + ".tem"
+            try:
+                with open(tem_path, "w") as f:
+                    f.write(data.getvalue())
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tem_path, self._config_path)
+            except OSError:
+                with self.lock:
+                    self._dirty = True
+                raise
+        logger.debug("配置已写入磁盘")
+
+    def _run_flusher(self):
+        """
+        后台写盘线程，等待 CONFIG_FLUSH_DELAY 秒以合并这段时间内的多次修改
+        :return:
+        """
+        while True:
+            with self.lock:
+                while not self._dirty:
+                    self._flush_cond.wait()
+            time.sleep(CONFIG_FLUSH_DELAY)
+            try:
+                self.flush()
+            except:
+                logger.exception("写入配置文件出错")
+
+    def wake(self):
+        """
+        唤醒正在 wait 的线程
+        :return:
+        """
+        self._wakeup.set()
+
+    def wait(self, timeout: float) -> bool:
+        """
+        休眠直到超时或被 wake 唤醒
+        :param timeout: 最长休眠时间（秒）
+        :return: 是否被唤醒
+        """
+        woken = self._wakeup.wait(timeout)
+        self._wakeup.clear()
+        return woken
@@ -16,6 +16,51 @@ if not os.path.exists(ALBUM_DIR):
 VCOM = -1.45
 WIDTH = 1872
 HEIGHT = 1404
+# 连续快速刷新（DU/A2）达到该次数后执行一次 GC16 全屏刷新以消除残影
+FAST_UPDATE_LIMIT = 20
+# 等待刷新的画面队列长度，队列满时丢弃最旧的画面
+DISPLAY_QUEUE_SIZE = 2
+# 微雪墨水屏 SPI 参数，None 表示使用驱动默认值；部分型号可稳定运行在 10-20 MHz
+SPI_SPEED_HZ = 4000000
+# Jetson 默认使用软件 SPI，设置 SPI_BUS 或 SPI_DEVICE 后改用硬件 spidev
+SPI_BUS = None
+SPI_DEVICE = None
+# 单次 SPI 传输的最大字节数，None 表示使用 spidev 的 bufsiz
+SPI_MAX_TRANSFER = None
+
+# 电影模式参数
+# 后台预先渲染的电影帧数量，默认为 0 即关闭帧缓存
+# 每帧以原始 RGB 像素保存（约 7.9 MB），开启时建议将 MOVIE_CACHE_DIR 设在 tmpfs 上以免磨损 SD 卡
+MOVIE_CACHE_FRAMES = 0
+# 电影帧缓存的文件夹，例如 "/dev/shm/epaper_movie_cache"
+MOVIE_CACHE_DIR = os.path.join(DATA_DIR, "movie_cache")
+# 向后跳过的帧数不超过该值时逐帧 grab，否则直接定位
+MAX_GRAB_FRAMES = 250
+
+# 相册模式参数
+# 缩放后照片缓存占用磁盘空间的上限（字节）
+ALBUM_CACHE_BYTES = 512 * 1024 * 1024
+
+# 文字绘制参数
+# 默认字体文件
+FONT_PATH = os.path.join(ROOT_DIR, "HanZiZhiMeiFangSongGBK.ttf")
+# 缓存的字体对象数量，每种字号一个
+FONT_CACHE_SIZE = 16
+# 缓存的文字排版结果数量
+TEXT_LAYOUT_CACHE_SIZE = 64
+
+# 图像读取参数
+# 上传或放入相册的图像文件大小上限（字节）
+MAX_IMAGE_BYTES = 64 * 1024 * 1024
+# 图像原始像素数上限，超过时不会尝试解码（防止解压炸弹）
+# Pillow 自身在超过 2 * Image.MAX_IMAGE_PIXELS（约 1.79 亿）像素时会拒绝打开，此值应低于它
+MAX_IMAGE_PIXELS = 160 * 1000 * 1000
+# 实际解码的像素数上限；JPEG 按比例缩小解码后计算，其它格式按原尺寸计算
+MAX_DECODE_PIXELS = 40 * 1000 * 1000
+# 同时解码的图像数量，与 MAX_DECODE_PIXELS 一起限制解码占用的内存
+MAX_CONCURRENT_DECODES = 1
+# 保留最近多少次图像读取的统计信息
+INGEST_HISTORY = 20
 
 # API 服务参数
 HOST = "0.0.0.0"
@@ -32,3 +77,7 @@ BUZZER_IO_PIN = 16
 CLEAR_BEFORE_UPDATE = False
 IS_RUN_GPIO = False
 HAS_BUZZER = False
+# 修改配置后延迟写入磁盘的时间（秒），期间的多次修改合并为一次写入
+CONFIG_FLUSH_DELAY = 5
+# 主循环单次休眠的最短时间（秒），避免到期时间计算误差导致空转
+MIN_SLEEP = 0.01
@@ -1,9 +1,67 @@
+import queue
+import threading
 from abc import ABCMeta, abstractmethod
+from typing import List, Optional, Tuple
 
+import numpy as np
 from IT8951 import constants
 from IT8951.display import AutoEPDDisplay
 from PIL import Image
 
+from constants import SPI_BUS, SPI_DEVICE, SPI_MAX_TRANSFER, SPI_SPEED_HZ, DISPLAY_QUEUE_SIZE
+from log import logger
+from waveform import Box, WaveformPolicy
+
+
+def _find_runs(mask: np.ndarray, gap: int) -> List[Tuple[int, int]]:
+    """
+    找出一维布尔数组中连续为 True 的区间，间隔不超过 gap 的区间会被合并
+    :param mask:
+    :param gap:
+    :return: [(start, end), ...]，end 不包含在区间内
+    """
+    index = np.flatnonzero(mask)
+    if index.size == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(index) > gap)
+    starts = np.concatenate(([index[0]], index[breaks + 1]))
+    ends = np.concatenate((index[breaks], [index[-1]])) + 1
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def compute_dirty_boxes(prev: np.ndarray, curr: np.ndarray, round_to: int = 8, gap: int = 32,
+                        max_boxes: int = 8) -> List[Box]:
+    """
+    比较前后两帧灰度图像，计算发生变化的像素所在的矩形区域
+    :param prev: 上一帧，形状为 (height, width)
+    :param curr: 当前帧，形状需与 prev 相同
+    :param round_to: 矩形边界对齐的像素数，IT8951 的像素打包要求边界按字节对齐
+    :param gap: 间隔小于该像素数的变化区域会被合并为一个矩形
+    :param max_boxes: 矩形数量上限，超出时合并为一个外接矩形
+    :return: [(left, top, right, bottom), ...]，画面无变化时返回空列表
+    """
+    height, width = curr.shape
+    diff = prev != curr
+    boxes = []
+    for top, bottom in _find_runs(diff.any(axis=1), gap):
+        band = diff[top:bottom]
+        for left, right in _find_runs(band.any(axis=0), gap):
+            rows = _find_runs(band[:, left:right].any(axis=1), height)
+            boxes.append((left, top + rows[0][0], right, top + rows[0][1]))
+    if len(boxes) > max_boxes:
+        boxes = [(
+            min(box[0] for box in boxes),
+            min(box[1] for box in boxes),
+            max(box[2] for box in boxes),
+            max(box[3] for box in boxes),
+        )]
+    return [(
+        left // round_to * round_to,
+        top // round_to * round_to,
+        min(-(-right // round_to) * round_to, width),
+        min(-(-bottom // round_to) * round_to, height),
+    ) for left, top, right, bottom in boxes]
+
 
 class Display(metaclass=ABCMeta):
     @abstractmethod
@@ -11,13 +69,32 @@ class Display(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def update(self, file):
+    def update_image(self, image: Image.Image):
+        """
+        直接使用内存中的图像刷新屏幕
+        :param image:
+        :return:
+        """
         pass
 
+    def update(self, file):
+        """
+        兼容以文件或类文件对象刷新屏幕的旧接口
+        :param file:
+        :return:
+        """
+        self.update_image(Image.open(file))
+
 
 class IT8951Display(Display):
-    def __init__(self, vcom: float):
+    def __init__(self, vcom: float, partial_ratio: float = 0.5):
         self._epd = AutoEPDDisplay(vcom=vcom)
+        # 变化区域占全屏的比例超过该值时直接全屏刷新
+        self._partial_ratio = partial_ratio
+        # 记录上次推送到屏幕的画面，用于计算变化区域
+        self._last_frame: Optional[np.ndarray] = None
+        # 根据画面内容选择刷新波形
+        self._policy = WaveformPolicy()
 
     @property
     def width(self) -> int:
@@ -29,24 +106,135 @@ class IT8951Display(Display):
 
     def clear(self):
         self._epd.clear()
+        self._last_frame = None
+        self._policy.reset()
 
-    def update(self, file):
-        self._epd.frame_buf.paste(0xFF, box=(0, 0, self.width, self.height))
-        img = Image.open(file)
-        self._epd.frame_buf.paste(img, (0, 0))
-        self._epd.draw_full(constants.DisplayModes.GC16)
+    def update_image(self, image: Image.Image):
+        frame_buf = self._epd.frame_buf
+        frame_buf.paste(0xFF, box=(0, 0, self.width, self.height))
+        frame_buf.paste(image, (0, 0))
+        # 未设置 rotate，frame_buf 与屏幕方向一致，可直接比较
+        frame = np.array(frame_buf)
+        if self._last_frame is None:
+            self._draw_full(constants.DisplayModes.GC16)
+            self._last_frame = frame
+            return
+        boxes = compute_dirty_boxes(self._last_frame, frame)
+        if not boxes:
+            return
+        mode, cleanup = self._policy.select(self._last_frame, frame, boxes)
+        area = sum((box[2] - box[0]) * (box[3] - box[1]) for box in boxes)
+        if cleanup or area > self._partial_ratio * self.width * self.height:
+            self._draw_full(mode)
+        else:
+            for box in boxes:
+                self._draw_box(frame_buf, box, mode)
+        self._last_frame = frame
+
+    def _draw_full(self, mode: int):
+        """
+        全屏刷新，使用 GC16 全屏刷新后残影被清除
+        :param mode:
+        :return:
+        """
+        self._epd.draw_full(mode)
+        if mode == constants.DisplayModes.GC16:
+            self._policy.reset()
+
+    def _draw_box(self, frame_buf: Image.Image, box: Box, mode: int):
+        """
+        仅将指定矩形区域的像素写入控制器并局部刷新
+        :param frame_buf:
+        :param box:
+        :param mode:
+        :return:
+        """
+        xy = (box[0], box[1])
+        dims = (box[2] - box[0], box[3] - box[1])
+        self._epd.update(frame_buf.crop(box).tobytes(), xy, dims, mode)
 
 
 class WaveShareDisplay(Display):
-    def __init__(self):
+    def __init__(self, spi_speed_hz: Optional[int] = SPI_SPEED_HZ, spi_max_transfer: Optional[int] = SPI_MAX_TRANSFER):
         # 此处根据自己购买的墨水屏型号自行修改 self._epd
-        from waveshare_epd import epd5in65f
+        from waveshare_epd import epdconfig, epd5in65f
+        epdconfig.spi_config(bus=SPI_BUS, device=SPI_DEVICE, speed_hz=spi_speed_hz, max_transfer=spi_max_transfer)
         self._epd = epd5in65f.EPD()
         self._epd.init()
 
     def clear(self):
         self._epd.Clear()
 
-    def update(self, file):
-        img = Image.open(file)
-        self._epd.display(self._epd.getbuffer(img))
+    def update_image(self, image: Image.Image):
+        self._epd.display(self._epd.getbuffer(image))
+
+
+class AsyncDisplay(Display):
+    """
+    异步刷新屏幕的代理
+    渲染线程只把画面放入有界队列后立即返回，由单独的显示线程驱动硬件；
+    显示线程每次只刷新队列中最新的画面，已被取代的旧画面直接丢弃
+    """
+
+    def __init__(self, display: Display, maxsize: int = DISPLAY_QUEUE_SIZE):
+        self._display = display
+        # 待显示的画面，None 表示清屏
+        self._queue: "queue.Queue[Optional[Image.Image]]" = queue.Queue(maxsize)
+        self._lock = threading.Lock()
+        # 记录是否有被丢弃的清屏请求，保证 CLEAR_BEFORE_UPDATE 时仍会先清屏
+        self._pending_clear = False
+        self._thread = threading.Thread(target=self._run, name="display", daemon=True)
+        self._thread.start()
+
+    def _put(self, frame: Optional[Image.Image]):
+        with self._lock:
+            while True:
+                try:
+                    self._queue.put_nowait(frame)
+                    return
+                except queue.Full:
+                    pass
+                # 队列已满时丢弃最旧的画面
+                try:
+                    dropped = self._queue.get_nowait()
+                except queue.Empty:
+                    continue
+                self._pending_clear = self._pending_clear or dropped is None
+                logger.debug("显示队列已满，丢弃最旧的画面")
+
+    def _take_latest(self) -> Tuple[Optional[Image.Image], bool]:
+        """
+        阻塞取出队列中最新的画面
+        :return: (画面, 刷新前是否需要清屏)
+        """
+        frame = self._queue.get()
+        clear = frame is None
+        while True:
+            try:
+                newer = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            logger.debug("丢弃已被取代的画面")
+            clear = clear or newer is None
+            frame = newer
+        with self._lock:
+            clear = clear or self._pending_clear
+            self._pending_clear = False
+        return frame, clear
+
+    def _run(self):
+        while True:
+            frame, clear = self._take_latest()
+            try:
+                if clear:
+                    self._display.clear()
+                if frame is not None:
+                    self._display.update_image(frame)
+            except:
+                logger.exception("刷新屏幕出错")
+
+    def clear(self):
+        self._put(None)
+
+    def update_image(self, image: Image.Image):
+        self._put(image)
@@ -1,4 +1,6 @@
 import time
+from threading import Event
+from typing import Optional
 
 from RPi import GPIO
 
@@ -20,10 +22,27 @@ class Button:
         if vcc != 0:
             GPIO.setup(vcc, GPIO.OUT, initial=GPIO.HIGH)
         GPIO.setup(out, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
-        GPIO.add_event_detect(self._out, GPIO.RISING, bouncetime=bounce_time)
+        # 按键按下时由 RPi.GPIO 的回调线程置位
+        self._pressed = Event()
+        GPIO.add_event_detect(self._out, GPIO.RISING, callback=self._on_press, bouncetime=bounce_time)
+
+    def _on_press(self, channel):
+        self._pressed.set()
 
     def is_pressed(self) -> bool:
-        return GPIO.event_detected(self._out)
+        if self._pressed.is_set():
+            self._pressed.clear()
+            return True
+        return False
+
+    def wait_for_press(self, timeout: Optional[float] = None) -> bool:
+        """
+        阻塞直到按键被按下或超时
+        :param timeout: 超时时间（秒），None 表示一直等待
+        :return: 按键是否被按下
+        """
+        self._pressed.wait(timeout)
+        return self.is_pressed()
 
     def clean_up(self):
         GPIO.cleanup([self._vcc, self._out])
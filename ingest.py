@@ -0,0 +1,128 @@
+import os
+import time
+from collections import deque
+from threading import BoundedSemaphore, RLock
+from typing import Tuple
+
+from PIL import Image, ImageOps
+
+from constants import MAX_IMAGE_BYTES, MAX_IMAGE_PIXELS, MAX_DECODE_PIXELS, MAX_CONCURRENT_DECODES, INGEST_HISTORY
+from log import logger
+from utils import draft_img, get_orientation, resize_img, get_peak_rss
+
+
+class ImageTooLarge(ValueError):
+    """
+    图像文件或像素数超过限制
+    """
+    pass
+
+
+def _pixel_bytes(mode: str) -> int:
+    # Pillow 中单通道图像每像素占 1 字节，多通道图像每像素占 4 字节
+    return 1 if mode in ("1", "L", "P") else 4
+
+
+class ImageIngest:
+    """
+    读取用户提供的图像
+    在解码前检查文件大小和像素数，JPEG 按目标尺寸缩小解码，并限制同时解码的数量，
+    使读取任意大小的图像时内存峰值都有上限；每次读取都会记录解码尺寸和内存峰值
+    """
+
+    def __init__(self, max_bytes: int = MAX_IMAGE_BYTES, max_pixels: int = MAX_IMAGE_PIXELS,
+                 max_decode_pixels: int = MAX_DECODE_PIXELS, max_decodes: int = MAX_CONCURRENT_DECODES):
+        self._max_bytes = max_bytes
+        self._max_pixels = max_pixels
+        self._max_decode_pixels = max_decode_pixels
+        self._decodes = BoundedSemaphore(max_decodes)
+        self._history = deque(maxlen=INGEST_HISTORY)
+        self.requests = 0
+        self.rejected = 0
+        self.lock = RLock()
+
+    @staticmethod
+    def _file_size(file) -> int:
+        if isinstance(file, (str, bytes, os.PathLike)):
+            return os.path.getsize(file)
+        position = file.tell()
+        file.seek(0, os.SEEK_END)
+        size = file.tell()
+        file.seek(position)
+        return size
+
+    def _reject(self, msg: str):
+        with self.lock:
+            self.rejected += 1
+        logger.warning(msg)
+        raise ImageTooLarge(msg)
+
+    def load(self, file, size: Tuple[int, int], fill=(0xFF, 0xFF, 0xFF)) -> Image.Image:
+        """
+        读取图像并等比缩放到 size 尺寸的画布中
+        :param file: 文件路径或可 seek 的文件对象
+        :param size:
+        :param fill:
+        :return:
+        """
+        with self.lock:
+            self.requests += 1
+        file_bytes = self._file_size(file)
+        if file_bytes > self._max_bytes:
+            self._reject(f"图像文件过大：{file_bytes} 字节，上限为 {self._max_bytes} 字节")
+
+        start = time.time()
+        with self._decodes:
+            rss_before = get_peak_rss()
+            try:
+                data = Image.open(file)
+            except Image.DecompressionBombError as e:
+                self._reject(f"图像像素数过多：{e}")
+            with data:
+                source = data.size
+                if source[0] * source[1] > self._max_pixels:
+                    self._reject(f"图像像素数过多：{source[0]}x{source[1]}，上限为 {self._max_pixels}")
+                draft_img(data, size)
+                decoded = data.size
+                if decoded[0] * decoded[1] > self._max_decode_pixels:
+                    self._reject(f"图像解码尺寸过大：{decoded[0]}x{decoded[1]}，上限为 {self._max_decode_pixels} 像素")
+                # 通过尺寸检查后才读取方向信息，此时即使需要解码也不会超出内存上限
+                transposed = get_orientation(data) != 1
+                image = ImageOps.exif_transpose(data) if transposed else data
+                img = resize_img(image, size, fill)
+                # 解码后的图像、旋转时的副本、缩放结果和画布可能同时存在
+                decoded_bytes = decoded[0] * decoded[1] * _pixel_bytes(image.mode)
+                estimated = decoded_bytes * (2 if transposed else 1) + 2 * size[0] * size[1] * 4
+            rss_growth = max(0, get_peak_rss() - rss_before) * 1024
+
+        record = {
+            "time": start,
+            "cost": time.time() - start,
+            "file_bytes": file_bytes,
+            "source": source,
+            "decoded": decoded,
+            "estimated_peak_bytes": estimated,
+            # 本次读取期间进程内存峰值的增量，峰值未被刷新时为 0
+            "rss_peak_growth": rss_growth,
+        }
+        with self.lock:
+            self._history.append(record)
+        logger.debug(f"读取图像：{source[0]}x{source[1]} 解码为 {decoded[0]}x{decoded[1]}，"
+                     f"预计内存峰值 {estimated / 1024 / 1024:.1f} MB")
+        return img
+
+    def stats(self) -> dict:
+        with self.lock:
+            history = list(self._history)
+            return {
+                "requests": self.requests,
+                "rejected": self.rejected,
+                "max_bytes": self._max_bytes,
+                "max_pixels": self._max_pixels,
+                "max_decode_pixels": self._max_decode_pixels,
+                "max_estimated_peak_bytes": max((item["estimated_peak_bytes"] for item in history), default=0),
+                "history": history,
+            }
+
+
+image_ingest = ImageIngest()
@@ -1,5 +1,3 @@
-import glob
-import io
 import math
 import os.path
 import time
@@ -7,16 +5,19 @@ from abc import ABCMeta, abstractmethod
 from threading import RLock
 from typing import Optional, Tuple
 
-import cv2
 from PIL import Image, ImageDraw
 from PIL.ImageOps import invert
 
+from album import AlbumIndex, PhotoCache, PhotoPrefetcher
 from config import Config
-from constants import WIDTH, HEIGHT, DATA_DIR, ALBUM_DIR, CLEAR_BEFORE_UPDATE
+from constants import WIDTH, HEIGHT, DATA_DIR, ALBUM_DIR, MOVIE_CACHE_DIR, CLEAR_BEFORE_UPDATE
 from display import Display
+from ingest import ImageTooLarge, image_ingest
 from log import logger
 from observer import Observer
-from utils import get_hash, draw_text, resize_img, mask_img
+from text import draw_text
+from utils import get_fingerprint, mask_img
+from video import MovieFrameCache, VideoReader, frame_to_image
 
 
 class BaseMode(Observer, metaclass=ABCMeta):
@@ -29,8 +30,10 @@ class BaseMode(Observer, metaclass=ABCMeta):
         self.config = {}
         # 存储当前模式的线程锁
         self.lock = RLock()
-        # 记录当前所处模式
-        self._current_mode = ""
+        # 记录本模式是否为当前模式
+        self._active = False
+        # 记录 self.config 对应的配置版本号，版本未变化时无需重新读取
+        self._config_version = -1
         # 存储控制墨水屏刷新的实例
         self._display: Optional[Display] = None
         # 记录是否首次运行
@@ -89,26 +92,19 @@ class BaseMode(Observer, metaclass=ABCMeta):
             self._display.clear()
             logger.debug(f"{self.name}：显示图像为 None，直接清屏")
             return
-        data = io.BytesIO()
-        image.save(data, format="PNG")
-        img_hash = get_hash(data.getvalue())
+        img_hash = get_fingerprint(image)
         if not compare_hash:
-            self._hash = img_hash
-            if CLEAR_BEFORE_UPDATE:
-                self._display.clear()
-            self._display.update(data)
-            logger.debug(f"{self.name}：无需比较 hash 值，屏幕已刷新")
-            return
-        else:
-            logger.debug(f"{self.name}：需要比较 hash 值")
-        if self._hash != img_hash:
-            self._hash = img_hash
-            if CLEAR_BEFORE_UPDATE:
-                self._display.clear()
-            self._display.update(data)
-            logger.debug(f"{self.name}：hash 值不同，屏幕已刷新")
+            logger.debug(f"{self.name}：无需比较 hash 值")
+        elif self._hash != img_hash:
+            logger.debug(f"{self.name}：hash 值不同")
         else:
             logger.debug(f"{self.name}：hash 值相同，跳过刷新")
+            return
+        self._hash = img_hash
+        if CLEAR_BEFORE_UPDATE:
+            self._display.clear()
+        self._display.update_image(image)
+        logger.debug(f"{self.name}：画面已提交刷新")
 
     def set_display(self, display: Display):
         """
@@ -130,6 +126,25 @@ class BaseMode(Observer, metaclass=ABCMeta):
             return True
         return False
 
+    def get_interval(self) -> Optional[float]:
+        """
+        定时刷新的时间间隔（秒），None 表示不需要定时刷新
+        :return:
+        """
+        return None
+
+    def next_due(self) -> Optional[float]:
+        """
+        本模式下次需要刷新的时间戳，不是当前模式或不需要定时刷新时返回 None
+        :return:
+        """
+        if not self._active:
+            return None
+        interval = self.get_interval()
+        if interval is None:
+            return None
+        return self._last_time + interval
+
     def once_init(self, config: Config):
         self.config = config.dict.get(self.name, {})
         self._last_time = time.time()
@@ -137,34 +152,42 @@ class BaseMode(Observer, metaclass=ABCMeta):
     def after_update(self, config: Config):
         pass
 
-    def update(self, notice: Config):
+    def enter(self, notice: Config):
         """
-        每次接收到配置参数时都会进行的更新函数
+        切换到本模式时调用，立即刷新一次屏幕
         :param notice:
         :return:
         """
-        mode = notice.dict["base"]["mode"]
-        logger.debug(f"{self.name}：当前模式为{mode}")
-
         if self._once:
             logger.debug(f"{self.name}：首次运行，初始化参数")
             self._once = False
             self.once_init(notice)
-
-        if mode != self.name:
-            self._current_mode = mode
-            logger.debug(f"{self.name}：与本模式无关，跳过")
-            return
-
+        self._active = True
         self.config = notice.dict.get(self.name, {})
-        logger.debug(f"{self.name}：模块配置已更新")
+        self._config_version = notice.version
+        self._last_time = time.time()
+        self._update_display(False)
+        logger.debug(f"{self.name}：切换到本模式，刷新成功")
 
-        if self._current_mode != mode:
-            self._current_mode = mode
-            self._last_time = time.time()
-            self._update_display(False)
-            logger.debug(f"{self.name}：切换到本模式，刷新成功")
-            return
+    def leave(self, notice: Config):
+        """
+        切换到其它模式时调用
+        :param notice:
+        :return:
+        """
+        self._active = False
+        logger.debug(f"{self.name}：已切换到{notice.active_name}模式")
+
+    def update(self, notice: Config):
+        """
+        本模式为当前模式时，每次接收到配置参数都会进行的更新函数
+        :param notice:
+        :return:
+        """
+        if notice.version != self._config_version:
+            self.config = notice.dict.get(self.name, {})
+            self._config_version = notice.version
+            logger.debug(f"{self.name}：模块配置已更新")
 
         if self.need_update():
             logger.debug(f"{self.name}：需要更新显示图像")
@@ -193,11 +216,14 @@ class FixedMode(BaseMode):
         self._image_path = os.path.join(DATA_DIR, f"{self.name}.png")
         self._need_update = False
 
+    def get_interval(self) -> Optional[float]:
+        return self.config.get("interval", 300)
+
     def need_update(self) -> bool:
         if self._need_update:
             self._need_update = False
             return True
-        if self.is_enough_interval(float(self.config.get("interval", "300"))):
+        if self.is_enough_interval(self.get_interval()):
             if not os.path.exists(self._image_path):
                 return False
             else:
@@ -216,7 +242,7 @@ class FixedMode(BaseMode):
         if file is None and text == "":
             return
         if file is not None:
-            image = resize_img(file, self.size)
+            image = image_ingest.load(file, self.size)
         else:
             if os.path.exists(self._image_path):
                 image = Image.open(self._image_path)
@@ -235,36 +261,105 @@ class MovieMode(BaseMode):
     def __init__(self):
         super().__init__()
         self._movie_path = os.path.join(DATA_DIR, "movie.mp4")
-        self._image_path = os.path.join(DATA_DIR, f"{self.name}.png")
+        # 跨多次刷新保持打开的解码会话
+        self._video = VideoReader(self._movie_path)
+        # 后台预先渲染的电影帧
+        self._cache = MovieFrameCache(self._movie_path, MOVIE_CACHE_DIR, self.size)
+
+    def get_interval(self) -> Optional[float]:
+        return self.config.get("interval", 60)
 
     def need_update(self) -> bool:
-        return self.is_enough_interval(float(self.config.get("interval", "60")))
+        return self.is_enough_interval(self.get_interval())
+
+    @property
+    def playback(self) -> str:
+        return self.config.get("playback", "step")
+
+    def get_step(self) -> int:
+        """
+        每次刷新前进的帧数
+        duration 和 clock 方式下根据视频总帧数、刷新间隔和目标总时长计算
+        :return:
+        """
+        duration = self.config.get("duration", 0)
+        if self.playback in ("duration", "clock") and duration > 0:
+            frame_count = self._video.frame_count
+            return max(1, round(frame_count * self.get_interval() / duration))
+        return max(1, self.config.get("step", 1))
+
+    def clock_index(self, now: float = None) -> int:
+        """
+        clock 方式下当前时刻应当显示的帧序号
+        :param now:
+        :return:
+        """
+        if now is None:
+            now = time.time()
+        duration = self.config.get("duration", 0)
+        start = self.config.get("start", 0)
+        if duration <= 0:
+            return self.config["index"]
+        return max(0, int((now - start) / duration * self._video.frame_count))
+
+    def clock_start(self, index: int, duration: float) -> float:
+        """
+        计算 clock 方式下从第 index 帧开始播放时对应的起始时间戳
+        :param index:
+        :param duration:
+        :return:
+        """
+        frame_count = self._video.frame_count
+        if frame_count <= 0 or duration <= 0:
+            return time.time()
+        return time.time() - index / frame_count * duration
+
+    def current_index(self) -> int:
+        if self.playback == "clock":
+            return self.clock_index()
+        return self.config["index"]
 
     def get_image(self) -> Optional[Image.Image]:
         if os.path.exists(self._movie_path):
-            video = cv2.VideoCapture(self._movie_path)
-            frame_index = int(self.config["index"])
-            # frame_count = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
-            # if frame_index > frame_count:
-            #     video.release()
-            #     return False
-            video.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
-            ret, frame = video.read()
+            index = self.current_index()
+            image = self._cache.get(index)
+            if image is not None:
+                logger.debug(f"{self.name}：使用缓存的第 {index} 帧")
+                return image
+            frame = self._video.read(index)
             if frame is not None:
-                cv2.imwrite(self._image_path, frame)
-                image = resize_img(self._image_path, self.size, (0x00, 0x00, 0x00))
+                image = frame_to_image(frame, self.size)
             else:
                 movie = self.empty_image()
                 image = draw_text("慢放电影模式\n电影已结束", movie)
-            video.release()
         else:
             movie = self.empty_image()
             image = draw_text("慢放电影模式\n电影不存在", movie)
         return image
 
+    def reset_video(self):
+        """
+        视频文件被替换后调用，使当前解码会话和帧缓存失效，并在后台重新渲染开头的帧
+        :return:
+        """
+        self._video.close()
+        self._cache.invalidate()
+        self._cache.prefetch(0)
+
+    def leave(self, notice: Config):
+        super().leave(notice)
+        # 离开本模式时释放解码器占用的资源
+        self._video.close()
+
     def after_update(self, config: Config):
-        index = int(self.config["index"])
-        config.update_config({self.name: {"index": index + 1}})
+        step = self.get_step()
+        if self.playback == "clock":
+            next_index = self.clock_index(time.time() + self.get_interval())
+        else:
+            index = self.config["index"]
+            next_index = index + step
+        config.update_config({self.name: {"index": next_index}})
+        self._cache.prefetch(next_index, step)
 
 
 class ClockMode(BaseMode):
@@ -315,8 +410,18 @@ class ClockMode(BaseMode):
             image = invert(image)
         return image
 
+    def next_due(self) -> Optional[float]:
+        # 每逢整 30 秒刷新，与表盘颜色反转的时刻对齐
+        if not self._active:
+            return None
+        return (self._last_time // 30 + 1) * 30
+
     def need_update(self) -> bool:
-        return self.is_enough_interval(30)
+        now = time.time()
+        if now // 30 != self._last_time // 30:
+            self._last_time = now
+            return True
+        return False
 
 
 class AlbumMode(BaseMode):
@@ -324,41 +429,62 @@ class AlbumMode(BaseMode):
 
     def __init__(self):
         super().__init__()
-        self._album_list = []
+        self._album = AlbumIndex(ALBUM_DIR)
         self._current_photo = ""
+        # 缩放后照片的磁盘缓存
+        self._cache = PhotoCache(os.path.join(DATA_DIR, "album_cache"))
+        # 在后台准备下一张照片
+        self._prefetch = PhotoPrefetcher(self._cache, self.size)
 
     def _update_album_list(self):
+        self._album.refresh()
         self._current_photo = self.config.get("current", "")
-        self._album_list = [file for file in glob.glob(os.path.join(ALBUM_DIR, "*"))]
-        if self._current_photo not in self._album_list:
-            if len(self._album_list) == 0:
-                self._current_photo = ""
-            else:
-                self._current_photo = self._album_list[0]
-
-    def _get_index(self) -> int:
-        for i in range(len(self._album_list)):
-            if self._album_list[i] == self._current_photo:
-                return i
+        if self._album.index_of(self._current_photo) is None:
+            self._current_photo = self._album.first()
 
     def _next_photo(self):
-        length = len(self._album_list)
-        if length > 0:
-            index = (self._get_index() + 1) % length
-            self._current_photo = self._album_list[index]
+        self._current_photo = self._album.next(self._current_photo)
+
+    def warm_up(self) -> bool:
+        """
+        在后台预先缩放相册中的所有照片
+        :return: 已有预热任务在运行时返回 False
+        """
+        self._album.refresh()
+        return self._cache.warm_up(self._album.photos(), self.size)
+
+    def cache_stats(self) -> dict:
+        return self._cache.stats()
 
     def after_update(self, config: Config):
         config.update_config({"album": {"current": self._current_photo}})
 
+    def get_interval(self) -> Optional[float]:
+        return self.config.get("interval", 86400)
+
     def need_update(self) -> bool:
-        return self.is_enough_interval(float(self.config.get("interval", "86400")))
+        return self.is_enough_interval(self.get_interval())
 
     def get_image(self) -> Optional[Image.Image]:
         self._update_album_list()
         if self._current_photo != "":
-            img = resize_img(os.path.join(ALBUM_DIR, self._current_photo), self.size)
+            img = self._prefetch.take(self._current_photo)
+            if img is None:
+                try:
+                    img = self._cache.get(self._current_photo, self.size)
+                except ImageTooLarge:
+                    img = self.empty_image()
+                    img = draw_text(f"轮播相册模式\n照片过大\n{os.path.basename(self._current_photo)}", img)
+            else:
+                logger.debug(f"{self.name}：使用预取的照片")
         else:
             img = self.empty_image()
             img = draw_text("轮播相册模式\n相册文件夹为空", img)
         self._next_photo()
+        # 当前照片显示的同时准备下一张，相册变化或选中其它照片时会重新开始
+        self._prefetch.start(self._current_photo)
         return img
+
+    def leave(self, notice: Config):
+        super().leave(notice)
+        self._prefetch.cancel()
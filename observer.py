@@ -1,5 +1,5 @@
 from abc import ABCMeta, abstractmethod
-from typing import List
+from typing import Dict, List, Optional
 
 
 class Observer(metaclass=ABCMeta):
@@ -11,6 +11,22 @@ class Observer(metaclass=ABCMeta):
     def update(self, notice):
         pass
 
+    def enter(self, notice):
+        """
+        成为当前激活的观察者时调用
+        :param notice:
+        :return:
+        """
+        pass
+
+    def leave(self, notice):
+        """
+        不再是当前激活的观察者时调用
+        :param notice:
+        :return:
+        """
+        pass
+
 
 class Subject:
     """
@@ -29,3 +45,50 @@ class Subject:
     def notify(self):
         for obs in self.observers:
             obs.update(self)
+
+
+class Dispatcher(Subject, metaclass=ABCMeta):
+    """
+    按名称索引观察者，只通知当前激活的观察者
+    激活的观察者发生变化时，分别向新旧观察者发送 enter 和 leave 事件
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._index: Dict[str, Observer] = {}
+        self._active: Optional[Observer] = None
+
+    @property
+    @abstractmethod
+    def active_name(self) -> str:
+        """
+        当前激活的观察者名称
+        :return:
+        """
+        pass
+
+    @property
+    def active(self) -> Optional[Observer]:
+        return self._active
+
+    def attach(self, obs: Observer):
+        super().attach(obs)
+        self._index[obs.name] = obs
+
+    def detach(self, obs: Observer):
+        super().detach(obs)
+        self._index.pop(obs.name, None)
+        if self._active is obs:
+            self._active = None
+
+    def notify(self):
+        obs = self._index.get(self.active_name)
+        if obs is not self._active:
+            if self._active is not None:
+                self._active.leave(self)
+            self._active = obs
+            if obs is not None:
+                obs.enter(self)
+            return
+        if obs is not None:
+            obs.update(self)
@@ -1,10 +1,12 @@
+import os
+import signal
 import threading
 import time
 from typing import Iterable
 
 from api import run_api
-from constants import HAS_BUZZER, IS_RUN_GPIO
-from display import Display
+from constants import HAS_BUZZER, IS_RUN_GPIO, MIN_SLEEP
+from display import AsyncDisplay, Display
 from gpio import Button, Buzzer
 from log import logger
 from mode import BaseMode
@@ -28,7 +30,13 @@ def run_mode(display: Display, modes: Iterable[BaseMode]):
             config.notify()
         except:
             logger.exception("主循环出错")
-        time.sleep(float(config.dict["base"]["heartbeat"]))
+        # 休眠到当前模式下次需要刷新的时刻，配置更新或按键按下时会被提前唤醒
+        # heartbeat 为最长休眠时间
+        timeout = config.dict["base"]["heartbeat"]
+        due = config.active.next_due() if config.active is not None else None
+        if due is not None:
+            timeout = min(timeout, max(due - time.time(), MIN_SLEEP))
+        config.wait(timeout)
 
 
 def run_gpio(modes: Iterable[BaseMode]):
@@ -45,7 +53,7 @@ def run_gpio(modes: Iterable[BaseMode]):
     modes = [mode.name for mode in modes]
 
     while True:
-        if button.is_pressed():
+        if button.wait_for_press():
             mode = config.dict["base"]["mode"]
             index = 0
             for i in range(len(modes)):
@@ -60,11 +68,27 @@ def run_gpio(modes: Iterable[BaseMode]):
             logger.debug(f"使用按键切换到{mode}模式")
             if HAS_BUZZER:
                 buzzer.repeated_beep(index + 1)
-        # 此处休眠时间调短可以提高按键的响应速度
-        # 我是为了防止短时间内响应多次按键，特意将其调高到了 1s
+        # 按键按下时会立即被唤醒，此处休眠只是为了防止短时间内响应多次按键
         time.sleep(1)
 
 
+def on_sigterm(signum, frame):
+    """
+    收到 SIGTERM 时写入尚未保存的配置后退出
+    其它线程都不是守护线程，直接退出进程而不等待它们结束
+    :param signum:
+    :param frame:
+    :return:
+    """
+    logger.debug("收到 SIGTERM，保存配置后退出")
+    try:
+        config.flush()
+    except:
+        logger.exception("退出前保存配置失败")
+    finally:
+        os._exit(0)
+
+
 def start_api(display: Display, modes: Iterable[BaseMode]):
     """
     主程序，启动各种不同的线程
@@ -72,6 +96,10 @@ def start_api(display: Display, modes: Iterable[BaseMode]):
     :param modes:
     :return:
     """
+    # systemd 停止服务时发送 SIGTERM，默认处理方式不会执行 atexit，需要先写入尚未保存的配置
+    signal.signal(signal.SIGTERM, on_sigterm)
+    # 屏幕刷新在独立的显示线程中进行，不会阻塞模式切换和下一帧的渲染
+    display = AsyncDisplay(display)
     threads = [
         threading.Thread(target=run_mode, args=(display, modes)),
         threading.Thread(target=run_api, args=(modes,)),
@@ -0,0 +1,120 @@
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+from constants import FONT_PATH, FONT_CACHE_SIZE, TEXT_LAYOUT_CACHE_SIZE
+
+# 行间距，相对于字号
+LINE_PADDING = 0.5
+# 文字区域四周留白的总和，相对于画布较短的一边
+BORDER = 0.2
+
+# 估算字号时使用的参考字号
+REFERENCE_SIZE = 100
+
+# 一行文字的位置：(x, y, 文字)
+Line = Tuple[int, int, str]
+
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def get_font(font: str, size: int) -> ImageFont.FreeTypeFont:
+    """
+    获取指定字号的字体对象，最近使用的字号会被缓存，避免重复读取字体文件
+    :param font: 字体文件路径
+    :param size: 字号
+    :return:
+    """
+    return ImageFont.truetype(font, size)
+
+
+def _text_bbox(lines: Tuple[str, ...], font: ImageFont.FreeTypeFont, size: int) -> Optional[Tuple[int, int, int, int]]:
+    """
+    计算多行文字实际占用的区域，第 i 行的基准位置为 (0, i * (1 + LINE_PADDING) * size)
+    :param lines:
+    :param font:
+    :param size:
+    :return: (左, 上, 右, 下)，没有可见文字时返回 None
+    """
+    bbox = None
+    for i, line in enumerate(lines):
+        if line == "":
+            continue
+        offset = int(i * (1 + LINE_PADDING) * size)
+        left, top, right, bottom = font.getbbox(line)
+        if bbox is None:
+            bbox = (left, top + offset, right, bottom + offset)
+        else:
+            bbox = (min(bbox[0], left), min(bbox[1], top + offset), max(bbox[2], right), max(bbox[3], bottom + offset))
+    return bbox
+
+
+@lru_cache(maxsize=TEXT_LAYOUT_CACHE_SIZE)
+def layout_text(text: str, size: Tuple[int, int], font: str = FONT_PATH) -> Tuple[int, Tuple[Line, ...]]:
+    """
+    计算文字在 size 尺寸画布中居中显示时的最大字号和每行的位置
+    先按参考字号的实际边界等比例估算字号，再在估算值附近二分查找，结果会被缓存，重复绘制相同的文字时无需重新排版
+    :param text:
+    :param size:
+    :param font:
+    :return: (字号, 每行的位置)
+    """
+    lines = tuple(text.split("\n"))
+    border_size = min(BORDER * item for item in size)
+    max_width = size[0] - border_size
+    max_height = size[1] - border_size
+
+    # 查找过程中试用的字体对象不放入 get_font 的缓存，避免挤掉其它排版正在使用的字号
+    probes = {}
+
+    def fits(font_size: int) -> bool:
+        if font_size not in probes:
+            probes[font_size] = ImageFont.truetype(font, font_size)
+        bbox = _text_bbox(lines, probes[font_size], font_size)
+        return bbox is None or (bbox[2] - bbox[0] <= max_width and bbox[3] - bbox[1] <= max_height)
+
+    # 文字边界与字号近似成正比，只有字形对齐像素带来少量误差
+    bbox = _text_bbox(lines, get_font(font, REFERENCE_SIZE), REFERENCE_SIZE)
+    if bbox is None:
+        return REFERENCE_SIZE, ()
+    estimate = max(1, int(REFERENCE_SIZE * min(max_width / max(1, bbox[2] - bbox[0]),
+                                               max_height / max(1, bbox[3] - bbox[1]))))
+    window = max(2, estimate // 32)
+    # 字号不超过可用的高度
+    limit = max(1, int(max_height))
+    low, high = min(limit, max(1, estimate - window)), min(limit, estimate + window)
+    # 估算偏差超出范围时退回到完整的查找范围
+    if not fits(low):
+        low = 1
+    if high < limit and fits(high):
+        high = limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if fits(middle):
+            low = middle
+        else:
+            high = middle - 1
+
+    bbox = _text_bbox(lines, get_font(font, low), low)
+    if bbox is None:
+        return low, ()
+    x = int((size[0] - (bbox[2] - bbox[0])) / 2) - bbox[0]
+    y = int((size[1] - (bbox[3] - bbox[1])) / 2) - bbox[1]
+    return low, tuple((x, y + int(i * (1 + LINE_PADDING) * low), line) for i, line in enumerate(lines) if line != "")
+
+
+def draw_text(text: str, img: Image.Image, font: str = None):
+    """
+    以能放入画布的最大字号，在图像中央绘制黑色的多行文字
+    :param text:
+    :param img:
+    :param font: 字体文件路径，默认使用 FONT_PATH
+    :return:
+    """
+    if font is None:
+        font = FONT_PATH
+    font_size, lines = layout_text(text, img.size, font)
+    draw = ImageDraw.Draw(img)
+    for x, y, line in lines:
+        draw.text((x, y), line, (0, 0, 0), get_font(font, font_size))
+    return img
@@ -1,12 +1,17 @@
 import hashlib
 import io
-import os
-from math import floor
-from typing import Union
+import resource
+import zlib
+from typing import Tuple, Union
 
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageOps
 
-from constants import ROOT_DIR
+# EXIF 中表示图像方向的标签
+EXIF_ORIENTATION = 0x0112
+# 读取 EXIF 时不会解码图像的格式
+EXIF_FORMATS = ("JPEG", "MPO", "TIFF", "WEBP")
+# resize 时先用 reduce 缩小到不小于目标尺寸 REDUCING_GAP 倍，再进行重采样
+REDUCING_GAP = 3.0
 
 
 def get_hash(file: Union[bytes, Image.Image]) -> str:
@@ -17,66 +22,108 @@ def get_hash(file: Union[bytes, Image.Image]) -> str:
     return hashlib.md5(file).hexdigest()
 
 
-def resize_img(file, size, fill=(0xFF, 0xFF, 0xFF)):
-    img = Image.new("RGB", size, fill)
-    data = Image.open(file)
-    if data.size[0] / data.size[1] < size[0] / size[1]:
+def get_fingerprint(image: Image.Image) -> str:
+    """
+    计算图像指纹，用于判断画面是否变化
+    直接对原始像素数据做 crc32，省去 PNG 编码与 md5 的开销
+    :param image:
+    :return:
+    """
+    checksum = zlib.crc32(image.tobytes())
+    return f"{image.mode}-{image.width}x{image.height}-{checksum:08x}"
+
+
+def fit_size(src: Tuple[int, int], size: Tuple[int, int]) -> Tuple[int, int, int, int]:
+    """
+    计算将 src 尺寸的图像等比缩放后居中放入 size 尺寸画布的位置
+    :param src:
+    :param size:
+    :return: (x, y, 宽, 高)
+    """
+    if src[0] / src[1] < size[0] / size[1]:
         target_height = size[1]
-        target_width = round(target_height / data.size[1] * data.size[0])
+        target_width = round(target_height / src[1] * src[0])
     else:
         target_width = size[0]
-        target_height = round(target_width / data.size[0] * data.size[1])
-    data = data.resize((target_width, target_height))
+        target_height = round(target_width / src[0] * src[1])
     x = round((size[0] - target_width) / 2)
     y = round((size[1] - target_height) / 2)
-    img.paste(data, (x, y))
-    return img
+    return x, y, target_width, target_height
+
+
+def get_orientation(data: Image.Image) -> int:
+    """
+    读取 EXIF 中的图像方向，不会解码图像
+    PNG 等格式没有 EXIF 数据时，getexif 会先解码整张图像再查找，因此只在确定不会解码时读取
+    :param data: Image.open 得到的图像
+    :return: 没有方向信息时返回 1
+    """
+    if data.format in EXIF_FORMATS or "exif" in data.info:
+        return data.getexif().get(EXIF_ORIENTATION, 1)
+    return 1
+
 
+def draft_img(data: Image.Image, size: Tuple[int, int]) -> Image.Image:
+    """
+    让尚未解码的图像按目标尺寸解码
+    JPEG 以能覆盖目标尺寸的最小比例（1/2、1/4、1/8）解码，其它格式保持原尺寸
+    :param data: Image.open 得到的图像
+    :param size: 最终需要放入的画布尺寸
+    :return: 调用后 data.size 即为实际解码的尺寸
+    """
+    # 只有 JPEG 支持按比例解码
+    if data.format not in ("JPEG", "MPO"):
+        return data
+    orientation = get_orientation(data)
+    width, height = data.size
+    # EXIF 方向为 5-8 时图像需要旋转 90 度，解码时的目标尺寸也要交换宽高
+    rotated = orientation in (5, 6, 7, 8)
+    if rotated:
+        width, height = height, width
+    _, _, target_width, target_height = fit_size((width, height), size)
+    if rotated:
+        target_width, target_height = target_height, target_width
+    data.draft("RGB", (target_width, target_height))
+    return data
 
-def get_text_width(text: str) -> float:
-    letter = "abcdefghijklmnopqrstuvwxyz"
-    number = "0123456789"
-    symbol = "~!@#$%^&*()_+`-=[]\;',./{}|:\"<>?"
-    others = " "
-    letter_width = 3 / 7
-    number_width = 3 / 7
-    symbol_width = 3 / 7
-    others_width = 0.5
-
-    width = 0
-    for item in text.lower():
-        if item in letter:
-            width += letter_width
-        elif item in number:
-            width += number_width
-        elif item in symbol:
-            width += symbol_width
-        elif item in others:
-            width += others_width
-        else:
-            width += 1
-    return width
-
-
-def draw_text(text: str, img: Image.Image, font: str = None):
-    if font is None:
-        font = os.path.join(ROOT_DIR, "HanZiZhiMeiFangSongGBK.ttf")
-
-    padding = 0.5
-    border = 0.2
-    border_size = min([border * item for item in img.size])
-    lines = text.split("\n")
-    width = max([get_text_width(item) for item in lines])
-    height = len(lines) + (len(lines) - 1) * padding
-    font_size = floor(min([(img.width - border_size) / width, (img.height - border_size) / height]))
-    max_width = width * font_size
-    max_height = height * font_size
-    x = int((img.width - max_width) / 2)
-    y = int((img.height - max_height) / 2)
-    draw = ImageDraw.Draw(img)
-    font = ImageFont.truetype(font, font_size)
-    for i in range(len(lines)):
-        draw.text((x, int(y + i * (1 + padding) * font_size)), lines[i], (0, 0, 0), font)
+
+def open_img(file, size: Tuple[int, int]) -> Image.Image:
+    """
+    按目标尺寸打开图像，并按 EXIF 信息旋转图像
+    :param file:
+    :param size: 最终需要放入的画布尺寸
+    :return:
+    """
+    data = draft_img(Image.open(file), size)
+    # 不需要旋转时 exif_transpose 也会复制一份图像，因此只在需要时调用
+    if get_orientation(data) != 1:
+        data = ImageOps.exif_transpose(data)
+    return data
+
+
+def get_peak_rss() -> int:
+    """
+    当前进程的内存峰值（KB）
+    优先读取 /proc/self/status 中的 VmHWM，它在 exec 后会重置，而 ru_maxrss 会继承父进程的值
+    :return:
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def resize_img(file, size, fill=(0xFF, 0xFF, 0xFF)):
+    img = Image.new("RGB", size, fill)
+    data = file if isinstance(file, Image.Image) else open_img(file, size)
+    x, y, target_width, target_height = fit_size(data.size, size)
+    # 先用 reduce 按整数倍快速缩小，再重采样到目标尺寸
+    data = data.resize((target_width, target_height), reducing_gap=REDUCING_GAP)
+    img.paste(data, (x, y))
     return img
 
 
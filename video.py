@@ -0,0 +1,277 @@
+import glob
+import os
+from threading import Condition, RLock, Thread
+from typing import Optional, Set, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from constants import MAX_GRAB_FRAMES, MOVIE_CACHE_FRAMES
+from log import logger
+from utils import fit_size
+
+
+class VideoReader:
+    """
+    长期保持打开的视频解码会话
+    按顺序读取下一帧时直接向后解码，只有帧序号跳变时才重新定位，
+    避免每次都重新打开文件并从关键帧开始解码
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._capture: Optional[cv2.VideoCapture] = None
+        # 打开文件时的 (修改时间, 大小)，用于发现文件被替换
+        self._stat: Optional[Tuple[float, int]] = None
+        # 下一次 read 将要解码的帧序号，None 表示位置未知
+        self._next_index: Optional[int] = None
+        self.lock = RLock()
+
+    def _file_stat(self) -> Optional[Tuple[float, int]]:
+        try:
+            stat = os.stat(self._path)
+        except OSError:
+            return None
+        return stat.st_mtime, stat.st_size
+
+    def _open(self) -> bool:
+        stat = self._file_stat()
+        if self._capture is not None and stat == self._stat:
+            return True
+        self.close()
+        if stat is None:
+            return False
+        self._capture = cv2.VideoCapture(self._path)
+        if not self._capture.isOpened():
+            logger.warning(f"无法打开视频：{self._path}")
+            self.close()
+            return False
+        self._stat = stat
+        self._next_index = 0
+        logger.debug(f"打开视频解码会话：{self._path}")
+        return True
+
+    def close(self):
+        """
+        关闭解码会话，下次读取时重新打开文件
+        :return:
+        """
+        with self.lock:
+            if self._capture is not None:
+                self._capture.release()
+                logger.debug(f"关闭视频解码会话：{self._path}")
+            self._capture = None
+            self._stat = None
+            self._next_index = None
+
+    @property
+    def frame_count(self) -> int:
+        """
+        视频总帧数，无法打开视频时返回 0
+        :return:
+        """
+        with self.lock:
+            if not self._open():
+                return 0
+            return max(int(self._capture.get(cv2.CAP_PROP_FRAME_COUNT)), 0)
+
+    def read(self, index: int) -> Optional[np.ndarray]:
+        """
+        读取指定序号的帧
+        :param index:
+        :return: BGR 格式的帧，超出视频长度或读取失败时返回 None
+        """
+        with self.lock:
+            if not self._open():
+                return None
+            skip = index - self._next_index if self._next_index is not None else -1
+            if 0 < skip <= MAX_GRAB_FRAMES:
+                # 向后跳过少量帧时只解码不转换，比重新定位到关键帧再解码更快
+                for _ in range(skip):
+                    if not self._capture.grab():
+                        self._next_index = None
+                        return None
+            elif skip != 0:
+                logger.debug(f"视频定位到第 {index} 帧")
+                self._capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+            ret, frame = self._capture.read()
+            self._next_index = index + 1 if ret else None
+            return frame if ret else None
+
+
+def frame_to_image(frame: np.ndarray, size: Tuple[int, int]) -> Image.Image:
+    """
+    将 OpenCV 解码得到的 BGR 帧缩放为屏幕尺寸的 PIL 图像，空白处填充黑色
+    全程在内存中完成，缩小时使用 cv2 的区域插值
+    :param frame:
+    :param size:
+    :return:
+    """
+    x, y, width, height = fit_size((frame.shape[1], frame.shape[0]), size)
+    shrink = width < frame.shape[1]
+    frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA if shrink else cv2.INTER_LINEAR)
+    img = Image.new("RGB", size, (0x00, 0x00, 0x00))
+    img.paste(Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)), (x, y))
+    return img
+
+
+class MovieFrameCache:
+    """
+    电影帧缓存
+    由后台线程预先解码接下来要显示的若干帧，缩放并转换为屏幕可直接显示的图像后，
+    以原始像素数据保存为 {视频大小}-{修改时间}-{index}.raw 文件，读取时只需一次文件读取；
+    文件名包含视频的大小和修改时间，视频被替换后旧视频的帧不会再被读取
+    """
+    # 与 frame_to_image 的结果相同，使用缓存与否得到的画面完全一致
+    MODE = "RGB"
+
+    def __init__(self, path: str, cache_dir: str, size: Tuple[int, int], ahead: int = MOVIE_CACHE_FRAMES):
+        self._path = path
+        self._cache_dir = cache_dir
+        self._size = size
+        self._ahead = ahead
+        self._frame_bytes = len(Image.new(self.MODE, (1, 1)).tobytes()) * size[0] * size[1]
+        self._cond = Condition()
+        # 待处理的预取请求 (起始帧序号, 帧间隔)
+        self._target: Optional[Tuple[int, int]] = None
+        # 视频文件被替换时递增，用于丢弃旧视频的渲染结果
+        self._generation = 0
+        self._thread: Optional[Thread] = None
+        # 删除上次运行中断时留下的临时文件
+        for file in glob.glob(os.path.join(self._cache_dir, "*.tem")):
+            try:
+                os.remove(file)
+            except OSError:
+                pass
+
+    def _movie_key(self) -> Optional[str]:
+        """
+        由视频文件的大小和修改时间生成缓存文件名前缀
+        :return: 视频文件不存在时返回 None
+        """
+        try:
+            stat = os.stat(self._path)
+        except OSError:
+            return None
+        return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+    def _frame_path(self, key: str, index: int) -> str:
+        return os.path.join(self._cache_dir, f"{key}-{index}.raw")
+
+    def _cached_indexes(self, key: Optional[str]) -> Set[int]:
+        """
+        已缓存的帧序号，不属于当前视频的缓存文件会被删除
+        :param key:
+        :return:
+        """
+        indexes = set()
+        for file in glob.glob(os.path.join(self._cache_dir, "*.raw")):
+            name = os.path.splitext(os.path.basename(file))[0]
+            prefix, _, index = name.rpartition("-")
+            if key is not None and prefix == key and index.isdigit():
+                indexes.add(int(index))
+                continue
+            try:
+                os.remove(file)
+            except OSError:
+                pass
+        return indexes
+
+    def get(self, index: int) -> Optional[Image.Image]:
+        """
+        读取已缓存的帧
+        :param index:
+        :return: 未缓存时返回 None
+        """
+        if self._ahead <= 0:
+            return None
+        key = self._movie_key()
+        if key is None:
+            return None
+        try:
+            with open(self._frame_path(key, index), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) != self._frame_bytes:
+            return None
+        return Image.frombytes(self.MODE, self._size, data)
+
+    def prefetch(self, index: int, step: int = 1):
+        """
+        在后台渲染从 index 开始、间隔 step 的后续帧，不阻塞调用方
+        :param index:
+        :param step:
+        :return:
+        """
+        if self._ahead <= 0:
+            return
+        with self._cond:
+            self._target = (index, step)
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name="movie-cache", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def invalidate(self):
+        """
+        视频文件被替换后调用，清空已缓存的帧
+        :return:
+        """
+        with self._cond:
+            self._generation += 1
+            self._target = None
+            self._cached_indexes(None)
+        logger.debug("电影帧缓存已清空")
+
+    def _run(self):
+        # 缓存线程使用独立的解码会话，与显示线程互不干扰
+        reader = VideoReader(self._path)
+        last_generation = self._generation
+        while True:
+            with self._cond:
+                while self._target is None:
+                    self._cond.wait()
+                (start, step), generation = self._target, self._generation
+                self._target = None
+            if generation != last_generation:
+                reader.close()
+                last_generation = generation
+            try:
+                self._fill(reader, start, step, generation)
+            except:
+                logger.exception("预先渲染电影帧出错")
+                reader.close()
+
+    def _fill(self, reader: VideoReader, start: int, step: int, generation: int):
+        os.makedirs(self._cache_dir, exist_ok=True)
+        key = self._movie_key()
+        if key is None:
+            return
+        wanted = [start + i * step for i in range(self._ahead)]
+        # 删除不再需要的帧
+        for index in self._cached_indexes(key) - set(wanted):
+            os.remove(self._frame_path(key, index))
+        cached = self._cached_indexes(key)
+        for index in wanted:
+            if index in cached:
+                continue
+            with self._cond:
+                # 有新的预取请求或视频已被替换时放弃本次渲染
+                if self._target is not None or self._generation != generation:
+                    return
+            frame = reader.read(index)
+            if frame is None:
+                break
+            data = frame_to_image(frame, self._size).tobytes()
+            tem_path = self._frame_path(key, index) + ".tem"
+            with open(tem_path, "wb") as f:
+                f.write(data)
+            with self._cond:
+                # 渲染期间视频被替换时，读到的可能是新视频的帧，不能以旧的前缀保存
+                if self._generation != generation or self._movie_key() != key:
+                    os.remove(tem_path)
+                    return
+                os.replace(tem_path, self._frame_path(key, index))
+        logger.debug(f"电影帧缓存已更新：第 {start} 帧起共 {len(wanted)} 帧")
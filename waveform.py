@@ -0,0 +1,70 @@
+from typing import List, Tuple
+
+import numpy as np
+from IT8951.constants import DisplayModes
+
+from constants import FAST_UPDATE_LIMIT
+from log import logger
+
+Box = Tuple[int, int, int, int]
+
+# 刷新速度快但只能显示黑白两色的波形
+FAST_MODES = (DisplayModes.DU, DisplayModes.A2)
+
+
+def _is_binary(region: np.ndarray) -> bool:
+    """
+    判断灰度区域是否只包含纯黑与纯白
+    :param region:
+    :return:
+    """
+    hist = np.bincount(region.ravel(), minlength=256)
+    return not hist[1:255].any()
+
+
+class WaveformPolicy:
+    """
+    根据画面内容为每次刷新选择最快的有效波形
+    """
+
+    def __init__(self, fast_limit: int = FAST_UPDATE_LIMIT):
+        # 连续快速刷新次数上限，超出后执行一次 GC16 全屏刷新
+        self._fast_limit = fast_limit
+        # 记录自上次 GC16 全屏刷新后的快速刷新次数
+        self._fast_count = 0
+
+    def reset(self):
+        """
+        屏幕已执行全屏刷新或清屏，残影已被清除
+        :return:
+        """
+        self._fast_count = 0
+
+    def select(self, prev: np.ndarray, curr: np.ndarray, boxes: List[Box]) -> Tuple[int, bool]:
+        """
+        选择刷新波形
+        :param prev: 上一帧灰度图像
+        :param curr: 当前帧灰度图像
+        :param boxes: 发生变化的矩形区域
+        :return: (波形, 是否需要执行 GC16 全屏刷新以消除残影)
+        """
+        if not all(_is_binary(curr[top:bottom, left:right]) for left, top, right, bottom in boxes):
+            # 包含灰阶的内容（如照片）只能使用 GC16
+            mode = DisplayModes.GC16
+        elif all(_is_binary(prev[top:bottom, left:right]) for left, top, right, bottom in boxes):
+            # 黑白之间的切换使用最快的 A2
+            mode = DisplayModes.A2
+        else:
+            # 从灰阶切换到黑白时 A2 无效，使用 DU
+            mode = DisplayModes.DU
+
+        if mode not in FAST_MODES:
+            logger.debug(f"刷新波形：{mode}")
+            return mode, False
+        self._fast_count += 1
+        if self._fast_count > self._fast_limit:
+            self.reset()
+            logger.debug(f"快速刷新已达 {self._fast_limit} 次，执行 GC16 全屏刷新消除残影")
+            return DisplayModes.GC16, True
+        logger.debug(f"刷新波形：{mode}，连续快速刷新 {self._fast_count} 次")
+        return mode, False
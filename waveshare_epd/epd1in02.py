@@ -31,6 +31,7 @@
 import logging
 
 from . import epdconfig
+from . import packing
 
 # Display resolution
 EPD_WIDTH = 80
@@ -112,15 +113,16 @@ class EPD:
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
 
+    # send a lot of data
+    def send_data2(self, data):
+        epdconfig.digital_write(self.dc_pin, 1)
+        epdconfig.digital_write(self.cs_pin, 0)
+        epdconfig.spi_writebyte2(data)
+        epdconfig.digital_write(self.cs_pin, 1)
+
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        self.send_command(0x71)
-        busy = epdconfig.digital_read(self.busy_pin)
-        busy = not (busy & 0x01)
-        while (busy):
-            self.send_command(0x71)
-            busy = epdconfig.digital_read(self.busy_pin)
-            busy = not (busy & 0x01)
+        epdconfig.wait_busy(self.busy_pin, 1, poll=lambda: self.send_command(0x71))
         epdconfig.delay_ms(800)
         logger.debug("e-Paper busy release")
 
@@ -131,21 +133,17 @@ class EPD:
 
     def SetFulltReg(self):
         self.send_command(0x23)
-        for count in range(0, 42):
-            self.send_data(self.lut_w1[count])
+        self.send_data2(self.lut_w1[:42])
 
         self.send_command(0x24)
-        for count in range(0, 42):
-            self.send_data(self.lut_b1[count])
+        self.send_data2(self.lut_b1[:42])
 
     def SetPartReg(self):
         self.send_command(0x23)
-        for count in range(0, 42):
-            self.send_data(self.lut_w[count])
+        self.send_data2(self.lut_w[:42])
 
         self.send_command(0x24)
-        for count in range(0, 42):
-            self.send_data(self.lut_b[count])
+        self.send_data2(self.lut_b[:42])
 
     def Init(self):
         if (epdconfig.module_init() != 0):
@@ -241,26 +239,7 @@ class EPD:
         return 0
 
     def getbuffer(self, image):
-        buf = [0xFF] * (int(self.width / 8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        if (imwidth == self.width and imheight == self.height):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif (imwidth == self.height and imheight == self.width):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy * self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return packing.getbuffer(image, self.width, self.height)
 
     def display(self, image):
         if (image == None):
@@ -272,14 +251,10 @@ class EPD:
             Width = self.width / 8 + 1
 
         self.send_command(0x10)
-        for j in range(0, self.height):
-            for i in range(0, int(Width)):
-                self.send_data(0xff)
+        self.send_data2([0xff] * (int(Width) * self.height))
 
         self.send_command(0x13)
-        for j in range(0, self.height):
-            for i in range(0, int(Width)):
-                self.send_data(image[i + j * int(Width)])
+        self.send_data2(image[:int(Width) * self.height])
         self.TurnOnDisplay()
 
     def Clear(self):
@@ -292,14 +267,10 @@ class EPD:
         Height = self.height
 
         self.send_command(0x10)
-        for j in range(0, Height):
-            for i in range(0, int(Width)):
-                self.send_data(0x00)
+        self.send_data2([0x00] * (int(Width) * Height))
 
         self.send_command(0x13)
-        for j in range(0, Height):
-            for i in range(0, int(Width)):
-                self.send_data(0xff)
+        self.send_data2([0xff] * (int(Width) * Height))
         self.TurnOnDisplay()
 
     def DisplayPartial(self, old_Image, Image):
@@ -323,14 +294,10 @@ class EPD:
         Height = self.height
         # send data
         self.send_command(0x10)
-        for j in range(0, Height):
-            for i in range(0, int(Width)):
-                self.send_data(old_Image[i + j * int(Width)])
+        self.send_data2(old_Image[:int(Width) * Height])
 
         self.send_command(0x13)
-        for j in range(0, Height):
-            for i in range(0, int(Width)):
-                self.send_data(Image[i + j * int(Width)])
+        self.send_data2(Image[:int(Width) * Height])
 
         # Set partial refresh
         self.TurnOnDisplay()
@@ -29,7 +29,10 @@
 
 import logging
 
+import numpy as np
+
 from . import epdconfig
+from . import packing
 
 # Display resolution
 EPD_WIDTH = 200
@@ -77,8 +80,7 @@ class EPD:
 
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while (epdconfig.digital_read(self.busy_pin) == 1):
-            epdconfig.delay_ms(100)
+        epdconfig.wait_busy(self.busy_pin, 0)
         logger.debug("e-Paper busy release")
 
     def init(self):
@@ -124,32 +126,15 @@ class EPD:
         return 0
 
     def getbuffer(self, image):
-        buf = [0xFF] * int(self.width * self.height / 8)
-        # Set buffer to value of Python Imaging Library image.
         # Image must be in mode 1.
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
+        imwidth, imheight = image.size
         if imwidth != self.width or imheight != self.height:
             raise ValueError('Image must be same dimensions as display \
                 ({0}x{1}).'.format(self.width, self.height))
-
-        pixels = image_monocolor.load()
-        for y in range(self.height):
-            for x in range(self.width):
-                # Set the bits for the column of pixels at the current position.
-                if pixels[x, y] == 0:
-                    buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        return buf
+        return packing.pack_bits(np.asarray(image.convert('1'))).tolist()
 
     def display(self, blackimage, redimage):
 
-        if self.width % 8 == 0:
-            linewidth = int(self.width / 8)
-        else:
-            linewidth = int(self.width / 8) + 1
-
-        buf = [0x00] * self.height * linewidth
-
         # send black data
         if (blackimage != None):
             self.send_command(0x24)  # DATA_START_TRANSMISSION_1
@@ -158,9 +143,7 @@ class EPD:
         # send red data        
         if (redimage != None):
             self.send_command(0x26)  # DATA_START_TRANSMISSION_2
-            for i in range(0, int(self.width * self.height / 8)):
-                buf[i] = ~redimage[i]
-            self.send_data2(buf)
+            self.send_data2(packing.invert(redimage))
 
         self.send_command(0x22)  # DISPLAY_REFRESH
         self.send_data(0xF7)
@@ -30,14 +30,16 @@
 
 import logging
 
-from PIL import Image
-
 from . import epdconfig
+from . import packing
 
 # Display resolution
 EPD_WIDTH = 168
 EPD_HEIGHT = 168
 
+# The 4 colors supported by the panel
+PALETTE = (0, 0, 0, 255, 255, 255, 255, 255, 0, 255, 0, 0)
+
 logger = logging.getLogger(__name__)
 
 
@@ -75,16 +77,21 @@ class EPD:
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
 
+    # send a lot of data
+    def send_data2(self, data):
+        epdconfig.digital_write(self.dc_pin, 1)
+        epdconfig.digital_write(self.cs_pin, 0)
+        epdconfig.spi_writebyte2(data)
+        epdconfig.digital_write(self.cs_pin, 1)
+
     def ReadBusyH(self):
         logger.debug("e-Paper busy H")
-        while (epdconfig.digital_read(self.busy_pin) == 0):  # 0: idle, 1: busy
-            epdconfig.delay_ms(5)
+        epdconfig.wait_busy(self.busy_pin, 1)
         logger.debug("e-Paper busy H release")
 
     def ReadBusyL(self):
         logger.debug("e-Paper busy L")
-        while (epdconfig.digital_read(self.busy_pin) == 1):  # 0: busy, 1: idle
-            epdconfig.delay_ms(5)
+        epdconfig.wait_busy(self.busy_pin, 0)
         logger.debug("e-Paper busy L release")
 
     def TurnOnDisplay(self):
@@ -155,32 +162,9 @@ class EPD:
         return 0
 
     def getbuffer(self, image):
-        # Create a pallette with the 4 colors supported by the panel
-        pal_image = Image.new("P", (1, 1))
-        pal_image.putpalette((0, 0, 0, 255, 255, 255, 255, 255, 0, 255, 0, 0) + (0, 0, 0) * 252)
-
-        # Check if we need to rotate the image
-        imwidth, imheight = image.size
-        if (imwidth == self.width and imheight == self.height):
-            image_temp = image
-        elif (imwidth == self.height and imheight == self.width):
-            image_temp = image.rotate(90, expand=True)
-        else:
-            logger.warning(
-                "Invalid image dimensions: %d x %d, expected %d x %d" % (imwidth, imheight, self.width, self.height))
-
-        # Convert the soruce image to the 4 colors, dithering if needed
-        image_4color = image_temp.convert("RGB").quantize(palette=pal_image)
-        buf_4color = bytearray(image_4color.tobytes('raw'))
-
-        # into a single byte to transfer to the panel
-        buf = [0x00] * int(self.width * self.height / 4)
-        idx = 0
-        for i in range(0, len(buf_4color), 4):
-            buf[idx] = (buf_4color[i] << 6) + (buf_4color[i + 1] << 4) + (buf_4color[i + 2] << 2) + buf_4color[i + 3]
-            idx += 1
-
-        return buf
+        # Convert the source image to the 4 colors, dithering if needed,
+        # and pack 2 bits per pixel to transfer to the panel
+        return packing.getbuffer_palette(image, self.width, self.height, PALETTE, 2)
 
     def display(self, image):
         if self.width % 4 == 0:
@@ -196,9 +180,7 @@ class EPD:
         self.ReadBusyH()
 
         self.send_command(0x10)
-        for j in range(0, Height):
-            for i in range(0, Width):
-                self.send_data(image[i + j * Width])
+        self.send_data2(image[:Width * Height])
 
         self.send_command(0x68)
         self.send_data(0x00)
@@ -219,9 +201,7 @@ class EPD:
         self.ReadBusyH()
 
         self.send_command(0x10)
-        for j in range(0, Height):
-            for i in range(0, Width):
-                self.send_data(color)
+        self.send_data2([color] * (Width * Height))
 
         self.send_command(0x68)
         self.send_data(0x00)
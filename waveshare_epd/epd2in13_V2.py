@@ -30,7 +30,10 @@
 
 import logging
 
+import numpy as np
+
 from . import epdconfig
+from . import packing
 
 # Display resolution
 EPD_WIDTH = 122
@@ -115,8 +118,7 @@ class EPD:
         epdconfig.digital_write(self.cs_pin, 1)
 
     def ReadBusy(self):
-        while (epdconfig.digital_read(self.busy_pin) == 1):  # 0: idle, 1: busy
-            epdconfig.delay_ms(100)
+        epdconfig.wait_busy(self.busy_pin, 0)
 
     def TurnOnDisplay(self):
         self.send_command(0x22)
@@ -183,8 +185,7 @@ class EPD:
             self.send_data(self.lut_full_update[75])
 
             self.send_command(0x32)
-            for count in range(70):
-                self.send_data(self.lut_full_update[count])
+            self.send_data2(self.lut_full_update[:70])
 
             self.send_command(0x4E)  # set RAM x address count to 0
             self.send_data(0x00)
@@ -199,8 +200,7 @@ class EPD:
             self.ReadBusy()
 
             self.send_command(0x32)
-            for count in range(70):
-                self.send_data(self.lut_partial_update[count])
+            self.send_data2(self.lut_partial_update[:70])
 
             self.send_command(0x37)
             self.send_data(0x00)
@@ -221,33 +221,18 @@ class EPD:
         return 0
 
     def getbuffer(self, image):
-        if self.width % 8 == 0:
-            linewidth = int(self.width / 8)
-        else:
-            linewidth = int(self.width / 8) + 1
-
-        buf = [0xFF] * (linewidth * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-
+        imwidth, imheight = image.size
+        pixels = np.asarray(image.convert('1'))
         if (imwidth == self.width and imheight == self.height):
             logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    if pixels[x, y] == 0:
-                        x = imwidth - x
-                        buf[int(x / 8) + y * linewidth] &= ~(0x80 >> (x % 8))
+            # column x is written to bit imwidth - x of the row
+            pixels = np.pad(pixels[:, ::-1], ((0, 0), (1, 0)), constant_values=True)
         elif (imwidth == self.height and imheight == self.width):
             logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        newy = imwidth - newy - 1
-                        buf[int(newx / 8) + newy * linewidth] &= ~(0x80 >> (y % 8))
-        return buf
+            pixels = pixels.T
+        else:
+            return [0xFF] * ((self.width + 7) // 8 * self.height)
+        return packing.pack_bits(pixels).tolist()
 
     def display(self, image):
         self.send_command(0x24)
@@ -255,21 +240,11 @@ class EPD:
         self.TurnOnDisplay()
 
     def displayPartial(self, image):
-        if self.width % 8 == 0:
-            linewidth = int(self.width / 8)
-        else:
-            linewidth = int(self.width / 8) + 1
-
-        buf = [0x00] * self.height * linewidth
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                buf[i + j * linewidth] = ~image[i + j * linewidth]
-
         self.send_command(0x24)
         self.send_data2(image)
 
         self.send_command(0x26)
-        self.send_data2(buf)
+        self.send_data2(packing.invert(image))
         self.TurnOnDisplayPart()
 
     def displayPartBaseImage(self, image):
@@ -81,8 +81,7 @@ class EPD:
     # judge e-Paper whether is busy
     def busy(self):
         logger.debug("e-Paper busy")
-        while (epdconfig.digital_read(self.busy_pin) != 0):
-            epdconfig.delay_ms(10)
+        epdconfig.wait_busy(self.busy_pin, 0)
         logger.debug("e-Paper busy release")
 
     # set the display window
@@ -30,14 +30,18 @@
 
 import logging
 
-from PIL import Image
+import numpy as np
 
 from . import epdconfig
+from . import packing
 
 # Display resolution
 EPD_WIDTH = 122
 EPD_HEIGHT = 250
 
+# The 4 colors supported by the panel
+PALETTE = (0, 0, 0, 255, 255, 255, 255, 255, 0, 255, 0, 0)
+
 logger = logging.getLogger(__name__)
 
 
@@ -80,11 +84,17 @@ class EPD:
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
 
+    # send a lot of data
+    def send_data2(self, data):
+        epdconfig.digital_write(self.dc_pin, 1)
+        epdconfig.digital_write(self.cs_pin, 0)
+        epdconfig.spi_writebyte2(data)
+        epdconfig.digital_write(self.cs_pin, 1)
+
     def ReadBusy(self):
         logger.debug("e-Paper busy H")
         epdconfig.delay_ms(100)
-        while (epdconfig.digital_read(self.busy_pin) == 0):  # 0: idle, 1: busy
-            epdconfig.delay_ms(5)
+        epdconfig.wait_busy(self.busy_pin, 1)
         logger.debug("e-Paper busy release")
 
     def SetWindow(self):
@@ -164,42 +174,9 @@ class EPD:
         return 0
 
     def getbuffer(self, image):
-        # Create a pallette with the 4 colors supported by the panel
-        pal_image = Image.new("P", (1, 1))
-        pal_image.putpalette((0, 0, 0, 255, 255, 255, 255, 255, 0, 255, 0, 0) + (0, 0, 0) * 252)
-
-        # Check if we need to rotate the image
-        imwidth, imheight = image.size
-        if (imwidth == self.width and imheight == self.height):
-            image_temp = image
-        elif (imwidth == self.height and imheight == self.width):
-            image_temp = image.rotate(90, expand=True)
-        else:
-            logger.warning(
-                "Invalid image dimensions: %d x %d, expected %d x %d" % (imwidth, imheight, self.width, self.height))
-
-        # Convert the soruce image to the 4 colors, dithering if needed
-        image_4color = image_temp.convert("RGB").quantize(palette=pal_image)
-        buf_4color = bytearray(image_4color.tobytes('raw'))
-
-        # into a single byte to transfer to the panel
-        if self.width % 4 == 0:
-            Width = self.width // 4
-        else:
-            Width = self.width // 4 + 1
-        Height = self.height
-        buf = [0x00] * int(Width * Height)
-        idx = 0
-        for j in range(0, Height):
-            for i in range(0, Width):
-                if i == Width - 1:
-                    buf[i + j * Width] = (buf_4color[idx] << 6) + (buf_4color[idx + 1] << 4)
-                    idx = idx + 2
-                else:
-                    buf[i + j * Width] = (buf_4color[idx] << 6) + (buf_4color[idx + 1] << 4) + (
-                                buf_4color[idx + 2] << 2) + buf_4color[idx + 3]
-                    idx = idx + 4
-        return buf
+        # Convert the source image to the 4 colors, dithering if needed,
+        # and pack 2 bits per pixel to transfer to the panel
+        return packing.getbuffer_palette(image, self.width, self.height, PALETTE, 2)
 
     def display(self, image):
         if self.width % 4 == 0:
@@ -209,12 +186,12 @@ class EPD:
         Height = self.height
 
         self.send_command(0x10)
-        for j in range(0, Height):
-            for i in range(0, self.Source_BITS // 4):
-                if i < 31:
-                    self.send_data(image[i + j * Width])
-                else:
-                    self.send_data(0x00)
+        # every line is Source_BITS wide, the bytes past the image are 0x00
+        rows = np.frombuffer(bytes(image[:Width * Height]), dtype=np.uint8).reshape(Height, Width)
+        lines = np.zeros((Height, self.Source_BITS // 4), dtype=np.uint8)
+        keep = min(31, self.Source_BITS // 4)
+        lines[:, :keep] = rows[:, :keep]
+        self.send_data2(bytearray(lines))
 
         self.TurnOnDisplay()
 
@@ -223,9 +200,7 @@ class EPD:
         Height = self.height
 
         self.send_command(0x10)
-        for j in range(0, Height):
-            for i in range(0, Width):
-                self.send_data(color)
+        self.send_data2([color] * (Width * Height))
         self.TurnOnDisplay()
 
     def sleep(self):
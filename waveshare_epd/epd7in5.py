@@ -30,7 +30,10 @@
 
 import logging
 
+import numpy as np
+
 from . import epdconfig
+from . import packing
 
 # Display resolution
 EPD_WIDTH = 640
@@ -77,8 +80,7 @@ class EPD:
 
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while (epdconfig.digital_read(self.busy_pin) == 0):  # 0: idle, 1: busy
-            epdconfig.delay_ms(100)
+        epdconfig.wait_busy(self.busy_pin, 1)
         logger.debug("e-Paper busy release")
 
     def init(self):
@@ -129,36 +131,17 @@ class EPD:
     def getbuffer(self, image):
         img = image
         imwidth, imheight = img.size
-        halfwidth = int(self.width / 2)
-        buf = [0x33] * halfwidth * self.height
-
         if (imwidth == self.width and imheight == self.height):
             img = img.convert('1')
         elif (imwidth == self.height and imheight == self.width):
             img = img.rotate(90, expand=True).convert('1')
-            imwidth, imheight = img.size
         else:
             logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
             # return a blank buffer
-            return buf
-
-        pixels = img.load()
-
-        for y in range(imheight):
-            offset = y * halfwidth
-            for x in range(1, imwidth, 2):
-                i = offset + x // 2
-                if (pixels[x - 1, y] > 191):
-                    if (pixels[x, y] > 191):
-                        buf[i] = 0x33
-                    else:
-                        buf[i] = 0x30
-                else:
-                    if (pixels[x, y] > 191):
-                        buf[i] = 0x03
-                    else:
-                        buf[i] = 0x00
-        return buf
+            return [0x33] * int(self.width / 2) * self.height
+
+        # 4 bits per pixel, 0x0 black and 0x3 white
+        return packing.pack_pixels(np.asarray(img) * 3, 4).tolist()
 
     def display(self, image):
         self.send_command(0x10)
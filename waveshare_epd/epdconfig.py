@@ -27,6 +27,7 @@
 # THE SOFTWARE.
 #
 
+import functools
 import logging
 import os
 import sys
@@ -34,6 +35,62 @@ import time
 
 logger = logging.getLogger(__name__)
 
+# Default transfer limit of the spidev kernel module (bufsiz parameter)
+SPIDEV_BUFSIZ = 4096
+
+
+@functools.lru_cache(maxsize=None)
+def spidev_bufsiz():
+    try:
+        with open('/sys/module/spidev/parameters/bufsiz') as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return SPIDEV_BUFSIZ
+
+
+def chunks(data, size):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+# Longest time a panel may stay busy before wait_busy gives up
+BUSY_TIMEOUT_MS = 60000
+# wait_for_edge is called in slices of BUSY_SLICE_MS so that an edge lost
+# between reading the pin and arming the detection only costs one slice
+BUSY_SLICE_MS = 100
+# Poll interval when edge detection is not available or a command has to be
+# sent to refresh the busy state
+BUSY_POLL_MS = 5
+
+
+def wait_for_level(gpio, pin, idle, timeout_ms=BUSY_TIMEOUT_MS, poll=None):
+    """
+    Block until `pin` reads `idle`, waking on the GPIO edge instead of
+    sleeping a fixed time. `poll` is called before every read for the
+    controllers that need a command (0x71) to update the busy pin.
+    Raises TimeoutError when the pin is still busy after timeout_ms.
+    """
+    edge = gpio.RISING if idle else gpio.FALLING
+    use_edge = poll is None
+    deadline = time.monotonic() + timeout_ms / 1000.0
+    while True:
+        if poll is not None:
+            poll()
+        if gpio.input(pin) == idle:
+            return
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("e-Paper still busy after %d ms" % timeout_ms)
+        if use_edge:
+            try:
+                gpio.wait_for_edge(pin, edge, timeout=max(1, min(BUSY_SLICE_MS, int(remaining * 1000))))
+                continue
+            except (RuntimeError, AttributeError):
+                # edge detection already in use on this pin or not supported
+                logger.debug("edge detection unavailable, polling busy pin")
+                use_edge = False
+        time.sleep(min(BUSY_POLL_MS / 1000.0, remaining))
+
 
 class RaspberryPi:
     # Pin definition
@@ -42,6 +99,11 @@ class RaspberryPi:
     CS_PIN = 8
     BUSY_PIN = 24
     PWR_PIN = 18
+    # SPI settings, change them with spi_config() before module_init()
+    SPI_BUS = 0
+    SPI_DEVICE = 0
+    SPI_SPEED_HZ = 4000000
+    SPI_MAX_TRANSFER = None  # None: the spidev bufsiz
 
     def __init__(self):
         import spidev
@@ -59,11 +121,30 @@ class RaspberryPi:
     def delay_ms(self, delaytime):
         time.sleep(delaytime / 1000.0)
 
+    def wait_busy(self, pin, idle, timeout_ms=BUSY_TIMEOUT_MS, poll=None):
+        wait_for_level(self.GPIO, pin, idle, timeout_ms, poll)
+
     def spi_writebyte(self, data):
         self.SPI.writebytes(data)
 
     def spi_writebyte2(self, data):
-        self.SPI.writebytes2(data)
+        # one transfer per chunk, the kernel refuses transfers larger than bufsiz
+        for chunk in chunks(data, self.SPI_MAX_TRANSFER or spidev_bufsiz()):
+            self.SPI.writebytes2(chunk)
+
+    def spi_config(self, bus=None, device=None, speed_hz=None, max_transfer=None):
+        if bus is not None:
+            self.SPI_BUS = bus
+        if device is not None:
+            self.SPI_DEVICE = device
+        if speed_hz is not None:
+            self.SPI_SPEED_HZ = speed_hz
+            if self.SPI.fileno() >= 0:
+                self.SPI.max_speed_hz = speed_hz
+        if max_transfer is not None:
+            self.SPI_MAX_TRANSFER = max_transfer
+        logger.debug("spi bus %d device %d, %d Hz, %s bytes per transfer" % (
+            self.SPI_BUS, self.SPI_DEVICE, self.SPI_SPEED_HZ, self.SPI_MAX_TRANSFER or 'bufsiz'))
 
     def module_init(self):
         self.GPIO.setmode(self.GPIO.BCM)
@@ -76,9 +157,9 @@ class RaspberryPi:
 
         self.GPIO.output(self.PWR_PIN, 1)
 
-        # SPI device, bus = 0, device = 0
-        self.SPI.open(0, 0)
-        self.SPI.max_speed_hz = 4000000
+        # SPI device, bus = SPI_BUS, device = SPI_DEVICE
+        self.SPI.open(self.SPI_BUS, self.SPI_DEVICE)
+        self.SPI.max_speed_hz = self.SPI_SPEED_HZ
         self.SPI.mode = 0b00
         return 0
 
@@ -101,6 +182,14 @@ class JetsonNano:
     CS_PIN = 8
     BUSY_PIN = 24
     PWR_PIN = 18
+    # SPI settings, change them with spi_config() before module_init()
+    SPI_BUS = 0
+    SPI_DEVICE = 0
+    SPI_SPEED_HZ = 4000000
+    SPI_MAX_TRANSFER = None  # None: the spidev bufsiz
+    # Software SPI by default, hardware spidev only when spi_config() is
+    # given a bus or device
+    SPI_HARDWARE = False
 
     def __init__(self):
         import ctypes
@@ -117,6 +206,8 @@ class JetsonNano:
                 break
         if self.SPI is None:
             raise RuntimeError('Cannot find sysfs_software_spi.so')
+        # hardware SPI, opened by module_init() when SPI_HARDWARE is set
+        self._spidev = None
 
         import Jetson.GPIO
         self.GPIO = Jetson.GPIO
@@ -130,12 +221,43 @@ class JetsonNano:
     def delay_ms(self, delaytime):
         time.sleep(delaytime / 1000.0)
 
+    def wait_busy(self, pin, idle, timeout_ms=BUSY_TIMEOUT_MS, poll=None):
+        wait_for_level(self.GPIO, self.BUSY_PIN, idle, timeout_ms, poll)
+
     def spi_writebyte(self, data):
+        if self._spidev is not None:
+            self._spidev.writebytes(data)
+            return
         self.SPI.SYSFS_software_spi_transfer(data[0])
 
     def spi_writebyte2(self, data):
-        for i in range(len(data)):
-            self.SPI.SYSFS_software_spi_transfer(data[i])
+        # bulk transfer through the hardware SPI when spidev is enabled
+        if self._spidev is not None:
+            for chunk in chunks(data, self.SPI_MAX_TRANSFER or spidev_bufsiz()):
+                self._spidev.writebytes2(chunk)
+            return
+        transfer = self.SPI.SYSFS_software_spi_transfer
+        for byte in bytes(data):
+            transfer(byte)
+
+    def spi_config(self, bus=None, device=None, speed_hz=None, max_transfer=None):
+        if bus is not None:
+            self.SPI_BUS = bus
+            self.SPI_HARDWARE = True
+        if device is not None:
+            self.SPI_DEVICE = device
+            self.SPI_HARDWARE = True
+        if speed_hz is not None:
+            self.SPI_SPEED_HZ = speed_hz
+            if self._spidev is not None:
+                self._spidev.max_speed_hz = speed_hz
+        if max_transfer is not None:
+            self.SPI_MAX_TRANSFER = max_transfer
+        if self.SPI_HARDWARE:
+            logger.debug("spi bus %d device %d, %d Hz, %s bytes per transfer" % (
+                self.SPI_BUS, self.SPI_DEVICE, self.SPI_SPEED_HZ, self.SPI_MAX_TRANSFER or 'bufsiz'))
+        else:
+            logger.debug("software spi")
 
     def module_init(self):
         self.GPIO.setmode(self.GPIO.BCM)
@@ -148,12 +270,24 @@ class JetsonNano:
 
         self.GPIO.output(self.PWR_PIN, 1)
 
+        if self.SPI_HARDWARE:
+            import spidev
+            self._spidev = spidev.SpiDev()
+            self._spidev.open(self.SPI_BUS, self.SPI_DEVICE)
+            self._spidev.max_speed_hz = self.SPI_SPEED_HZ
+            self._spidev.mode = 0b00
+            return 0
+
         self.SPI.SYSFS_software_spi_begin()
         return 0
 
     def module_exit(self):
         logger.debug("spi end")
-        self.SPI.SYSFS_software_spi_end()
+        if self._spidev is not None:
+            self._spidev.close()
+            self._spidev = None
+        else:
+            self.SPI.SYSFS_software_spi_end()
 
         logger.debug("close 5V, Module enters 0 power consumption ...")
         self.GPIO.output(self.RST_PIN, 0)
@@ -171,6 +305,11 @@ class SunriseX3:
     BUSY_PIN = 24
     PWR_PIN = 18
     Flag = 0
+    # SPI settings, change them with spi_config() before module_init()
+    SPI_BUS = 2
+    SPI_DEVICE = 0
+    SPI_SPEED_HZ = 4000000
+    SPI_MAX_TRANSFER = None  # None: the spidev bufsiz
 
     def __init__(self):
         import spidev
@@ -188,13 +327,31 @@ class SunriseX3:
     def delay_ms(self, delaytime):
         time.sleep(delaytime / 1000.0)
 
+    def wait_busy(self, pin, idle, timeout_ms=BUSY_TIMEOUT_MS, poll=None):
+        wait_for_level(self.GPIO, pin, idle, timeout_ms, poll)
+
     def spi_writebyte(self, data):
         self.SPI.writebytes(data)
 
     def spi_writebyte2(self, data):
         # for i in range(len(data)):
         #     self.SPI.writebytes([data[i]])
-        self.SPI.xfer3(data)
+        for chunk in chunks(data, self.SPI_MAX_TRANSFER or spidev_bufsiz()):
+            self.SPI.xfer3(chunk)
+
+    def spi_config(self, bus=None, device=None, speed_hz=None, max_transfer=None):
+        if bus is not None:
+            self.SPI_BUS = bus
+        if device is not None:
+            self.SPI_DEVICE = device
+        if speed_hz is not None:
+            self.SPI_SPEED_HZ = speed_hz
+            if self.SPI.fileno() >= 0:
+                self.SPI.max_speed_hz = speed_hz
+        if max_transfer is not None:
+            self.SPI_MAX_TRANSFER = max_transfer
+        logger.debug("spi bus %d device %d, %d Hz, %s bytes per transfer" % (
+            self.SPI_BUS, self.SPI_DEVICE, self.SPI_SPEED_HZ, self.SPI_MAX_TRANSFER or 'bufsiz'))
 
     def module_init(self):
         if self.Flag == 0:
@@ -209,9 +366,9 @@ class SunriseX3:
 
             self.GPIO.output(self.PWR_PIN, 1)
 
-            # SPI device, bus = 0, device = 0
-            self.SPI.open(2, 0)
-            self.SPI.max_speed_hz = 4000000
+            # SPI device, bus = SPI_BUS, device = SPI_DEVICE
+            self.SPI.open(self.SPI_BUS, self.SPI_DEVICE)
+            self.SPI.max_speed_hz = self.SPI_SPEED_HZ
             self.SPI.mode = 0b00
             return 0
         else:
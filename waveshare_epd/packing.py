@@ -0,0 +1,200 @@
+# *****************************************************************************
+# * | File        :   packing.py
+# * | Function    :   Vectorized image buffer packing shared by the drivers
+# * | Info        :
+# ******************************************************************************
+
+import functools
+import logging
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# 2 bit gray code of every 'L' value: the top two bits, after 0xC0 and 0x80
+# are moved one level down the way getbuffer_4Gray always did
+GRAY_CODES = np.arange(256, dtype=np.uint8) >> 6
+GRAY_CODES[0xC0] = 2
+GRAY_CODES[0x80] = 1
+
+# How images given in the other orientation are mapped onto the panel:
+# ROTATE is newx = y, newy = height - x - 1, TRANSPOSE is newx = y, newy = x
+ROTATE = np.rot90
+TRANSPOSE = np.transpose
+
+
+def load_pixels(image, mode, width, height, turn=ROTATE):
+    """
+    Convert the image to `mode` and return it in panel orientation as a
+    (height, width) array. Images given in the other orientation are mapped
+    with `turn`. Returns None when the size matches neither orientation.
+    """
+    imwidth, imheight = image.size
+    if imwidth == width and imheight == height:
+        return np.asarray(image.convert(mode))
+    if imwidth == height and imheight == width:
+        return turn(np.asarray(image.convert(mode)))
+    return None
+
+
+def load_mono(image, width, height):
+    """
+    Mode '1' version of load_pixels, True for white.
+    """
+    return load_pixels(image, '1', width, height)
+
+
+def pack_bits(pixels):
+    """
+    Pack a (height, width) bool array MSB first, one row per
+    ceil(width / 8) bytes. Padding bits are set to 1 (white).
+    """
+    pad = -pixels.shape[1] % 8
+    if pad:
+        pixels = np.pad(pixels, ((0, 0), (0, pad)), constant_values=True)
+    return np.packbits(pixels, axis=1).ravel()
+
+
+def pack_pixels(values, bits):
+    """
+    Pack a (height, width) array of small integers MSB first, `bits` bits per
+    pixel. Rows are padded with zeros to a whole byte.
+    """
+    per_byte = 8 // bits
+    pad = -values.shape[1] % per_byte
+    if pad:
+        values = np.pad(values, ((0, 0), (0, pad)))
+    values = values.astype(np.uint8).reshape(values.shape[0], -1, per_byte)
+    shifts = np.arange(8 - bits, -1, -bits, dtype=np.uint8)
+    return np.bitwise_or.reduce(values << shifts, axis=2).ravel()
+
+
+def as_array(buf):
+    """
+    View a list, bytes or bytearray buffer as a uint8 array.
+    """
+    return np.frombuffer(bytes(buf), dtype=np.uint8)
+
+
+def invert(buf):
+    """
+    Invert every byte of the buffer, returning a bytearray.
+    """
+    return bytearray(np.bitwise_xor(as_array(buf), 0xFF))
+
+
+def expand_bits(buf):
+    """
+    Send every bit twice: each byte becomes two bytes, MSB first.
+    """
+    bits = np.unpackbits(as_array(buf))
+    return bytearray(np.packbits(np.repeat(bits, 2)))
+
+
+def join_nibbles(nibbles):
+    """
+    Pack a flat array of 4 bit values two per byte, high nibble first.
+    """
+    nibbles = nibbles.astype(np.uint8).reshape(-1, 2)
+    return bytearray(nibbles[:, 0] << 4 | nibbles[:, 1])
+
+
+def repack_2bpp(buf, nibbles):
+    """
+    Repack a 2 bits per pixel buffer to 4 bits per pixel, mapping every
+    2 bit code to nibbles[code].
+    """
+    bits = np.unpackbits(as_array(buf)).reshape(-1, 2)
+    codes = bits[:, 0] << 1 | bits[:, 1]
+    return join_nibbles(np.array(nibbles, dtype=np.uint8)[codes])
+
+
+def interleave_tricolor(black, red):
+    """
+    Merge the black and red 1 bit planes into the 4 bits per pixel format of
+    the older tricolor controllers: 0x4 red, 0x0 black, 0x3 white. Red wins
+    where both planes are set (bit 0).
+    """
+    black = np.unpackbits(as_array(black))
+    red = np.unpackbits(as_array(red))
+    nibbles = np.where(red == 0, 0x04, np.where(black == 0, 0x00, 0x03))
+    return join_nibbles(nibbles)
+
+
+def getbuffer(image, width, height):
+    """
+    Standard 1 bit per pixel buffer: rows of ceil(width / 8) bytes, bit 1 is
+    white. A blank (all white) buffer is returned when the size is wrong.
+    """
+    pixels = load_mono(image, width, height)
+    if pixels is None:
+        return [0xFF] * ((width + 7) // 8 * height)
+    return pack_bits(pixels).tolist()
+
+
+def getbuffer_4gray(image, width, height, turn=ROTATE):
+    """
+    4 gray buffer: 2 bits per pixel, 0b11 white, 0b00 black. A blank (all
+    white) buffer is returned when the size is wrong.
+    """
+    pixels = load_pixels(image, 'L', width, height, turn)
+    if pixels is None:
+        return [0xFF] * (int(width / 4) * height)
+    return pack_pixels(GRAY_CODES[pixels], 2).tolist()
+
+
+def split_4gray(buf):
+    """
+    Split a 4 gray buffer into the two 1 bit planes the controllers expect,
+    returned as (high, low): the high and low bit of every pixel's code.
+    """
+    bits = np.unpackbits(as_array(buf)).reshape(-1, 2)
+    return np.packbits(bits[:, 0]).tolist(), np.packbits(bits[:, 1]).tolist()
+
+
+@functools.lru_cache(maxsize=None)
+def palette_image(colors):
+    """
+    'P' image holding the flat RGB tuple `colors` (padded with black to 256
+    entries) to quantize against. Cached, so it is only built once per panel.
+    """
+    pal_image = Image.new("P", (1, 1))
+    pal_image.putpalette(colors + (0, 0, 0) * (256 - len(colors) // 3))
+    return pal_image
+
+
+def getbuffer_palette(image, width, height, colors, bits):
+    """
+    Quantize the image (dithering if needed) to the panel colors and pack the
+    palette indices, `bits` bits per pixel, into a bytearray. Images given in
+    portrait are rotated by 90 degrees first.
+    """
+    imwidth, imheight = image.size
+    if imwidth == width and imheight == height:
+        image_temp = image
+    elif imwidth == height and imheight == width:
+        image_temp = image.rotate(90, expand=True)
+    else:
+        logger.warning("Invalid image dimensions: %d x %d, expected %d x %d" % (imwidth, imheight, width, height))
+        raise ValueError("Invalid image dimensions")
+
+    indices = np.asarray(image_temp.convert("RGB").quantize(palette=palette_image(colors)))
+    return bytearray(pack_pixels(indices, bits))
+
+
+def getbuffer_colors(image, width, height, colors, bits):
+    """
+    Pack the index of every pixel's exact color in the list of RGB tuples
+    `colors`, `bits` bits per pixel. Pixels matching no color get index 0.
+    An all zero buffer is returned when the size is wrong.
+    """
+    pixels = load_pixels(image, 'RGB', width, height)
+    if pixels is None:
+        return bytearray(width * height * bits // 8)
+    pixels = pixels.astype(np.uint32)
+    keys = pixels[..., 0] << 16 | pixels[..., 1] << 8 | pixels[..., 2]
+    indices = np.zeros(keys.shape, dtype=np.uint8)
+    for index, (r, g, b) in enumerate(colors):
+        indices[keys == (r << 16 | g << 8 | b)] = index
+    return bytearray(pack_pixels(indices, bits))